@@ -0,0 +1,74 @@
+"""
+Assignments of values to symbols.
+
+Every symbolic state carries an assignment that satisfies its path
+condition (as far as the assignment goes -- symbols that are missing
+in it are unknown). A branch condition that evaluates to true or false
+under the assignment is witnessed to be satisfiable on that side
+without calling the solver.
+"""
+
+from z3 import substitute, simplify, is_true, is_false
+
+
+class Assignment:
+    """ Immutable (partial) model of a path condition """
+
+    __slots__ = ('_values',)
+
+    def __init__(self, values=None):
+        # id of symbol -> (symbol, value)
+        self._values = values or {}
+
+    @staticmethod
+    def from_model(model, symbols):
+        """
+        Create the assignment of the symbols from a z3 model, symbols
+        that the model does not interpret get the default values
+        """
+        return Assignment({s.get_id(): (s, model.eval(s, True))
+                           for s in symbols})
+
+    @staticmethod
+    def from_pairs(pairs):
+        """ Create the assignment from pairs (symbol, value) """
+        return Assignment({s.get_id(): (s, v) for s, v in pairs})
+
+    def pairs(self):
+        """ Get the list of pairs (symbol, value) """
+        return list(self._values.values())
+
+    def evaluate(self, expr):
+        """
+        Evaluate the expression under this assignment, return True or False
+        if the result is constant and None if the result is not known
+        """
+        if not self._values:
+            return None
+        val = simplify(substitute(expr, *self._values.values()))
+        if is_true(val):
+            return True
+        if is_false(val):
+            return False
+        return None
+
+    def value(self, expr):
+        """ Get the (simplified) value of the expression """
+        if not self._values:
+            return simplify(expr)
+        return simplify(substitute(expr, *self._values.values()))
+
+    def replace(self, symbols, other):
+        """
+        Get a new assignment with values of the symbols (ids)
+        taken from the other assignment
+        """
+        values = {sid: v for sid, v in self._values.items()
+                  if sid not in symbols}
+        for sid, v in other._values.items():
+            if sid in symbols:
+                values[sid] = v
+        return Assignment(values)
+
+    def __repr__(self):
+        return repr({str(s): v for s, v in self._values.values()})
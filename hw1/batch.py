@@ -0,0 +1,386 @@
+"""
+Interpreter that runs the program on many inputs at once.
+
+Every input is a lane. Variables and values (registers) are NumPy
+arrays with one element per lane, together with masks that say in
+which lanes the variable was written or the value was computed. Lanes
+are executed in groups: all the lanes that reached the same block run
+its instructions together, every instruction is a single vectorized
+operation over the indices of the lanes in the group. A jump splits
+the group by the condition into the lanes that go to the one and
+to the other successor.
+
+Pending groups are kept per block and the block that comes first
+in the reverse post-order of the CFG is executed next. So lanes
+that went different ways at a branch wait for each other where the
+ways join and continue as one group, and lanes that leave a loop wait
+until all the lanes leave it.
+
+A lane that hits an error (an unknown value, an uninitialized
+variable, division by zero, a failed assertion) gets the same error
+message as in the Interpreter and is retired, the other lanes go on.
+Printed values are recorded with the lanes that printed them and can
+be formatted per lane after the run.
+
+Values are 64-bit integers (they wrap around on overflow) and div is
+the integer division of the symbolic executor (the remainder is never
+negative, see _div).
+"""
+
+from heapq import heappush, heappop
+
+import numpy as np
+
+from cfg import ControlFlowGraph
+from language import Instruction, Cmp
+
+
+def _div(a, b, dtype):
+    """ Integer division of SMT-LIB (as smt_div in expressions) """
+    r = np.mod(a, np.abs(b), dtype=dtype)
+    return np.floor_divide(np.subtract(a, r, dtype=dtype), b, dtype=dtype)
+
+
+_ARITH = {
+    Instruction.ADD: np.add,
+    Instruction.SUB: np.subtract,
+    Instruction.MUL: np.multiply,
+    Instruction.DIV: _div,
+}
+
+_PREDICATES = {
+    Cmp.LT: np.less,
+    Cmp.LE: np.less_equal,
+    Cmp.GT: np.greater,
+    Cmp.GE: np.greater_equal,
+    Cmp.EQ: np.equal,
+    Cmp.NE: np.not_equal,
+}
+
+
+class BatchResult:
+    """ Errors and outputs of the lanes of one batch """
+
+    def __init__(self, lanes):
+        self.lanes = lanes
+        # error message of every lane, None for lanes without errors
+        self.errors = np.full(lanes, None, dtype=object)
+        # (lanes, list of printed operands) in the order of execution,
+        # an operand is a constant or an array with an item per lane
+        self.prints = []
+        # the number of executed instructions summed over lanes
+        self.instructions = 0
+
+    def fail(self, lanes, msg):
+        self.errors[lanes] = msg
+
+    def get_error(self, lane):
+        """ Get the error of the lane or None """
+        return self.errors[lane]
+
+    def get_failed(self):
+        """ Get the indices of lanes that ended with an error """
+        return np.flatnonzero(self.errors != None)
+
+    def get_outputs(self):
+        """ Get the list of printed lines of every lane """
+        outputs = [[] for _ in range(self.lanes)]
+        for lanes, vals in self.prints:
+            cols = [v.tolist() if isinstance(v, np.ndarray)
+                    else [v] * len(lanes) for v in vals]
+            for lane, row in zip(lanes.tolist(), zip(*cols)):
+                outputs[lane].append(" ".join(map(str, row)))
+        return outputs
+
+
+class BatchInterpreter:
+    def __init__(self, program):
+        self.program = program
+        self.cfg = ControlFlowGraph(program)
+
+    def _alloc(self, lanes, dtype):
+        return np.zeros(lanes, dtype=dtype), np.zeros(lanes, dtype=bool)
+
+    def _check(self, ops, idx):
+        """
+        Retire the lanes in which some of the values ops is unknown,
+        return the remaining lanes
+        """
+        for op in ops:
+            if not isinstance(op, Instruction):
+                continue
+            known = self.known[op.get_slot()]
+            if known is None:
+                self.result.fail(idx, f"Using unknown value: {op}")
+                return idx[:0]
+            ok = known[idx]
+            if not ok.all():
+                self.result.fail(idx[~ok], f"Using unknown value: {op}")
+                idx = idx[ok]
+        return idx
+
+    def _eval(self, op, idx):
+        if isinstance(op, Instruction):
+            return self.values[op.get_slot()][idx]
+        return op
+
+    def _set(self, instruction, idx, val):
+        slot = instruction.get_slot()
+        if self.values[slot] is None:
+            dtype = np.result_type(val)
+            self.values[slot], self.known[slot] =\
+                self._alloc(self.result.lanes, dtype)
+        self.values[slot][idx] = val
+        self.known[slot][idx] = True
+
+    def _condition(self, cond, idx):
+        """
+        Evaluate the condition of a jump or an assertion in the lanes,
+        return the remaining lanes and the condition in them
+        """
+        if not isinstance(cond, Instruction):
+            return idx, np.full(len(idx), bool(cond))
+        idx = self._check([cond], idx)
+        if len(idx) == 0:
+            return idx, np.zeros(0, dtype=bool)
+        condval = self._eval(cond, idx)
+        if condval.dtype != bool:
+            valid = (condval == 0) | (condval == 1)
+            if not valid.all():
+                bad = ~valid
+                for lane, val in zip(idx[bad].tolist(),
+                                     condval[bad].tolist()):
+                    self.result.fail(lane, f"Invalid condition: {val}")
+                idx, condval = idx[valid], condval[valid]
+            condval = condval.astype(bool)
+        return idx, condval
+
+    def executeBlock(self, blk, idx):
+        """
+        Run the block in the lanes idx, return the list of pairs
+        (successor block, lanes) for the lanes that did not stop
+        """
+        result = self.result
+        for instruction in blk:
+            if len(idx) == 0:
+                return []
+            result.instructions += len(idx)
+            ty = instruction.get_ty()
+            if ty in _ARITH:
+                a, b = instruction.get_operands()
+                idx = self._check((a, b), idx)
+                if len(idx) == 0:
+                    return []
+                a, b = self._eval(a, idx), self._eval(b, idx)
+                if ty == Instruction.DIV:
+                    zero = np.asarray(b) == 0
+                    if zero.any():
+                        zero = np.broadcast_to(zero, idx.shape)
+                        result.fail(idx[zero],
+                                    f"Division by 0: {instruction}")
+                        idx = idx[~zero]
+                        a = a[~zero] if isinstance(a, np.ndarray) else a
+                        b = b[~zero] if isinstance(b, np.ndarray) else b
+                self._set(instruction, idx,
+                          _ARITH[ty](a, b, dtype=np.int64))
+            elif ty == Instruction.CMP:
+                a, b = instruction.get_operands()
+                idx = self._check((a, b), idx)
+                if len(idx) == 0:
+                    return []
+                pred = _PREDICATES[instruction.get_predicate()]
+                self._set(instruction, idx,
+                          pred(self._eval(a, idx), self._eval(b, idx)))
+            elif ty == Instruction.LOAD:
+                var = instruction.get_operand(0)
+                slot = var.get_slot()
+                ok = self.written[slot][idx]
+                if not ok.all():
+                    result.fail(idx[~ok], "Reading uninitialied variable: "
+                                          f"{var.get_name()}")
+                    idx = idx[ok]
+                    if len(idx) == 0:
+                        return []
+                self._set(instruction, idx, self.variables[slot][idx])
+            elif ty == Instruction.STORE:
+                val, var = instruction.get_operands()
+                idx = self._check([val], idx)
+                if len(idx) == 0:
+                    return []
+                slot = var.get_slot()
+                self.variables[slot][idx] = self._eval(val, idx)
+                self.written[slot][idx] = True
+            elif ty == Instruction.PRINT:
+                ops = instruction.get_operands()
+                for n, op in enumerate(ops):
+                    if not isinstance(op, Instruction):
+                        continue
+                    known = self.known[op.get_slot()]
+                    ok = np.zeros(len(idx), dtype=bool) if known is None\
+                         else known[idx]
+                    if ok.all():
+                        continue
+                    # the lanes print what they have so far and fail
+                    bad = idx[~ok]
+                    if n > 0:
+                        result.prints.append(
+                            (bad, [self._eval(o, bad) for o in ops[:n]]))
+                    result.fail(bad, f"Using unknown value: {op}")
+                    idx = idx[ok]
+                if ops and len(idx) > 0:
+                    result.prints.append(
+                        (idx, [self._eval(o, idx) for o in ops]))
+            elif ty == Instruction.ASSERT:
+                idx, condval = self._condition(instruction.get_condition(),
+                                               idx)
+                if not condval.all():
+                    result.fail(idx[~condval],
+                                f"Assertion failed: {instruction}")
+                    idx = idx[condval]
+            elif ty == Instruction.JUMP:
+                idx, condval = self._condition(instruction.get_condition(),
+                                               idx)
+                t, f = instruction.get_operands()
+                return [(t, idx[condval]), (f, idx[~condval])]
+            elif ty == Instruction.HALT:
+                return []
+            else:
+                raise RuntimeError(f"Unimplemented instruction: {instruction}")
+        return []
+
+    def run(self, inputs, lanes=None):
+        """
+        Run the program on a batch of inputs. inputs maps names of
+        variables to sequences of their initial values, one value per
+        lane (None for a lane in which the variable is uninitialized),
+        variables that are not in inputs are uninitialized.
+        Returns the BatchResult.
+        """
+        if lanes is None:
+            lanes = len(next(iter(inputs.values()))) if inputs else 1
+        self.result = BatchResult(lanes)
+        self.variables = []
+        self.written = []
+        for var in self.program.get_variables():
+            vals, written = self._alloc(lanes, np.int64)
+            init = inputs.get(var.get_name())
+            if init is not None:
+                assert len(init) == lanes, "Inputs of different lengths"
+                written[:] = [v is not None for v in init]
+                vals[written] = [v for v in init if v is not None]
+            self.variables.append(vals)
+            self.written.append(written)
+        self.values = [None] * self.program.get_values_num()
+        self.known = [None] * self.program.get_values_num()
+
+        # rpo index of the block -> lanes waiting at the block
+        pending = {}
+        order = []
+
+        def schedule(blk, idx):
+            if len(idx) == 0 or blk.size() == 0:
+                return
+            pos = self.cfg.rpo_index[blk]
+            if pos not in pending:
+                pending[pos] = (blk, [])
+                heappush(order, pos)
+            pending[pos][1].append(idx)
+
+        schedule(self.program.get_entry(), np.arange(lanes))
+        while order:
+            blk, groups = pending.pop(heappop(order))
+            idx = groups[0] if len(groups) == 1 else np.concatenate(groups)
+            for succ, succidx in self.executeBlock(blk, idx):
+                schedule(succ, succidx)
+        return self.result
+
+
+def read_inputs(path):
+    """
+    Read inputs from a CSV file with names of variables in the header
+    and a lane on every other line, empty cells are uninitialized
+    """
+    from csv import reader
+    with open(path, newline='') as f:
+        rows = reader(f)
+        names = [n.strip() for n in next(rows)]
+        columns = [[] for _ in names]
+        for row in rows:
+            if not row:
+                continue
+            for col, cell in zip(columns, row):
+                cell = cell.strip()
+                col.append(int(cell) if cell else None)
+    return dict(zip(names, columns))
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from time import perf_counter
+    from parser import Parser
+    from ircache import load_program
+    from optimizer import PassManager
+
+    argparser = ArgumentParser()
+    argparser.add_argument('--inputs', metavar='CSV',
+                           help='initial values of variables, a column '
+                                'per variable and a line per lane')
+    argparser.add_argument('--random', type=int, metavar='N',
+                           help='run N lanes with random initial values '
+                                'of all variables')
+    argparser.add_argument('--range', type=int, nargs=2, default=(-100, 100),
+                           metavar=('LO', 'HI'),
+                           help='range of the random values (default: '
+                                '-100 100)')
+    argparser.add_argument('--seed', type=int, default=None,
+                           help='seed for random inputs')
+    argparser.add_argument('--quiet', action='store_true',
+                           help='print only errors and statistics')
+    argparser.add_argument('--ir-cache', action='store_true',
+                           help='load the parsed program from a cache file '
+                                'next to it (PROGRAM.irc), create the file '
+                                'if it is missing or outdated')
+    argparser.add_argument('-O', '--optimize', action='store_true',
+                           help='optimize the program before running it')
+    argparser.add_argument('program')
+    args = argparser.parse_args()
+
+    if args.ir_cache:
+        program = load_program(args.program)
+    else:
+        program = Parser(args.program).parse()
+    if program is None:
+        print("Program parsing failed!")
+        exit(1)
+    if args.optimize:
+        PassManager().run(program)
+
+    lanes = None
+    if args.inputs is not None:
+        inputs = read_inputs(args.inputs)
+    elif args.random is not None:
+        rng = np.random.default_rng(args.seed)
+        lo, hi = args.range
+        lanes = args.random
+        inputs = {var.get_name(): rng.integers(lo, hi, lanes, endpoint=True)
+                  .tolist() for var in program.get_variables()}
+    else:
+        inputs = {}
+
+    start = perf_counter()
+    result = BatchInterpreter(program).run(inputs, lanes)
+    elapsed = perf_counter() - start
+
+    outputs = None if args.quiet else result.get_outputs()
+    for lane in range(result.lanes):
+        if outputs:
+            for line in outputs[lane]:
+                print(f"[{lane}] {line}")
+        if result.errors[lane] is not None:
+            print(f"[{lane}] Execution error: {result.errors[lane]}")
+
+    print(f"Lanes: {result.lanes}")
+    print(f"Error lanes: {len(result.get_failed())}")
+    print(f"Instruction-lanes: {result.instructions} "
+          f"({result.instructions / max(elapsed, 1e-9):.0f}/s)")
+    exit(1 if len(result.get_failed()) else 0)
@@ -0,0 +1,229 @@
+"""
+Scaling benchmark of the executors on generated programs.
+
+For every combination of the swept parameters of the generator (see
+generator.py) a program is generated and every engine is run on it
+in a separate process, which gives the wall time and the peak RSS of
+the run. Engines that run the program on concrete values only (the
+interpreter) stop at the first read of an input, so they get programs
+generated without inputs (nondet is 0). The results are written as CSV
+and, if matplotlib is installed, plotted against the size of the
+program (the number of instructions). Runs that did not exit with 0
+(timeouts, errors, failed assertions) are marked with crosses and are
+not connected with the lines of the engine.
+"""
+
+from inspect import signature
+from itertools import product
+from os import wait4, WIFEXITED, WEXITSTATUS
+from os.path import abspath, dirname, join
+from subprocess import Popen, DEVNULL
+from sys import executable, stderr
+from tempfile import TemporaryDirectory
+from threading import Timer
+from time import perf_counter
+
+from generator import ProgramGenerator
+
+_HERE = dirname(abspath(__file__))
+
+# engine -> command line without the program
+ENGINES = {
+    'interpreter': [join(_HERE, 'interpreter.py')],
+    'symbolic': [join(_HERE, 'symbolicexecutor.py')],
+    'concolic': [join(_HERE, 'concolic.py')],
+    'batch': [join(_HERE, 'batch.py'), '--random', '1000', '--quiet'],
+}
+
+# engines that cannot run programs with inputs
+CONCRETE = {'interpreter'}
+
+# parameters of the generator and their types
+PARAMETERS = {
+    'blocks': int,
+    'loop_depth': int,
+    'nondet': int,
+    'branch_density': float,
+    'assert_density': float,
+}
+
+# default values of the parameters
+DEFAULTS = {name: p.default
+            for name, p in signature(ProgramGenerator).parameters.items()
+            if name in PARAMETERS}
+
+FIELDS = ['engine', *PARAMETERS, 'seed', 'instructions', 'status',
+          'time', 'max_rss_kb']
+
+
+def measure(cmd, timeout=None):
+    """
+    Run the command, return the triple (status, wall time, peak RSS
+    in kilobytes), status is the exit code or 'timeout'
+    """
+    start = perf_counter()
+    P = Popen(cmd, stdout=DEVNULL, stderr=DEVNULL)
+    killed = []
+
+    def kill():
+        killed.append(True)
+        P.kill()
+
+    timer = Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.start()
+    # wait4 gives the resource usage of the finished process
+    _, status, usage = wait4(P.pid, 0)
+    elapsed = perf_counter() - start
+    if timer:
+        timer.cancel()
+    P.returncode = WEXITSTATUS(status) if WIFEXITED(status) else -1
+    if killed:
+        return 'timeout', elapsed, usage.ru_maxrss
+    return P.returncode, elapsed, usage.ru_maxrss
+
+
+def sweep(engines, params, seed=0, timeout=None, report=print):
+    """
+    Run the engines on programs generated for every combination
+    of the parameters, params maps the names of the parameters to lists
+    of their values. Returns the list of results (dictionaries with
+    the FIELDS), report is called with every result.
+    """
+    results = []
+    names = list(params)
+    with TemporaryDirectory() as tmp:
+
+        def generate(config):
+            """ Write the program, get its path and size """
+            text = ProgramGenerator(seed=seed, **config).generate()
+            path = join(tmp, f"program{config['nondet']}.txt")
+            with open(path, 'w') as f:
+                f.write(text)
+            # all lines but the declaration of variables, blocks
+            # and empty lines are instructions
+            instructions = sum(1 for line in text.splitlines()[1:]
+                               if line and not line.startswith('block'))
+            return path, instructions
+
+        for values in product(*(params[n] for n in names)):
+            symbolic = {**DEFAULTS, **dict(zip(names, values))}
+            concrete = {**symbolic, 'nondet': 0}
+            programs = {}
+            for engine in engines:
+                config = concrete if engine in CONCRETE else symbolic
+                key = config['nondet']
+                if key not in programs:
+                    programs[key] = generate(config)
+                path, instructions = programs[key]
+                status, elapsed, rss = measure(
+                    [executable, *ENGINES[engine], path], timeout)
+                result = {'engine': engine, **config, 'seed': seed,
+                          'instructions': instructions, 'status': status,
+                          'time': elapsed, 'max_rss_kb': rss}
+                results.append(result)
+                report(result)
+    return results
+
+
+def plot(results, path, x='instructions'):
+    """
+    Plot the time and memory of the engines against x, runs with
+    another status than 0 are marked
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, not plotting", file=stderr)
+        return False
+
+    fig, (time_ax, mem_ax) = plt.subplots(1, 2, figsize=(12, 5))
+    engines = sorted({r['engine'] for r in results})
+    for i, engine in enumerate(engines):
+        runs = sorted((r for r in results if r['engine'] == engine),
+                      key=lambda r: r[x])
+        ok = [r for r in runs if r['status'] == 0]
+        failed = [r for r in runs if r['status'] != 0]
+        for ax, y in ((time_ax, lambda r: r['time']),
+                      (mem_ax, lambda r: r['max_rss_kb'] / 1024)):
+            if ok:
+                ax.plot([r[x] for r in ok], [y(r) for r in ok], 'o-',
+                        color=f"C{i}", label=engine)
+            if failed:
+                ax.plot([r[x] for r in failed], [y(r) for r in failed],
+                        'x', color=f"C{i}", label=f"{engine} (failed)")
+    time_ax.set_xlabel(x)
+    time_ax.set_ylabel('wall time [s]')
+    mem_ax.set_xlabel(x)
+    mem_ax.set_ylabel('peak RSS [MB]')
+    for ax in (time_ax, mem_ax):
+        ax.legend()
+        ax.grid(True)
+    fig.tight_layout()
+    fig.savefig(path)
+    return True
+
+
+def _parse_sweep(text):
+    """ Parse 'name=v1,v2,...' """
+    name, _, values = text.partition('=')
+    name = name.replace('-', '_')
+    if name not in PARAMETERS or not values:
+        raise ValueError(f"Invalid sweep: {text}")
+    return name, [PARAMETERS[name](v) for v in values.split(',')]
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from csv import DictWriter
+    from sys import stdout
+
+    argparser = ArgumentParser()
+    argparser.add_argument('--engine', action='append',
+                           choices=ENGINES.keys(),
+                           help='engine to run, can be repeated '
+                                '(default: interpreter and symbolic)')
+    argparser.add_argument('--sweep', action='append', default=[],
+                           metavar='PARAM=V1,V2,...',
+                           help='values of a parameter of the generator '
+                                f"({', '.join(PARAMETERS)}), can be "
+                                'repeated, all combinations are run '
+                                '(default: blocks=10,20,40,80)')
+    argparser.add_argument('--seed', type=int, default=0,
+                           help='seed of the generator (default: 0)')
+    argparser.add_argument('--timeout', type=float, default=60,
+                           help='kill runs that take longer (in seconds, '
+                                'default: 60)')
+    argparser.add_argument('--csv', metavar='FILE',
+                           help='write the results to the file '
+                                '(default: standard output)')
+    argparser.add_argument('--plot', metavar='FILE',
+                           help='plot time and memory against the size '
+                                'of programs into the file (needs '
+                                'matplotlib)')
+    args = argparser.parse_args()
+
+    try:
+        params = dict(map(_parse_sweep, args.sweep))
+    except ValueError as e:
+        print(e, file=stderr)
+        exit(1)
+    if not params:
+        params = {'blocks': [10, 20, 40, 80]}
+
+    out = open(args.csv, 'w', newline='') if args.csv else stdout
+    writer = DictWriter(out, FIELDS, extrasaction='ignore')
+    writer.writeheader()
+
+    def report(result):
+        writer.writerow(result)
+        out.flush()
+
+    results = sweep(args.engine or ['interpreter', 'symbolic'], params,
+                    args.seed, args.timeout, report)
+    if out is not stdout:
+        out.close()
+    if args.plot:
+        plot(results, args.plot)
@@ -0,0 +1,72 @@
+"""
+Budgets of the symbolic executor.
+
+A budget limits the wall-clock time, the peak memory (the maximal
+resident set size of the process) and the number of finished paths
+of the exploration, the depth of paths (the number of constraints
+in their path conditions) and the time of every solver query.
+When the time, memory or paths are exhausted, the executor stops and
+reports what it has got so far (see SymbolicExecutor.get_results).
+States deeper than the bound on depth are dropped (and counted), the
+queries that time out are unknown and their branches are not explored
+(and counted too).
+
+Time and memory are checked only every CHECK_INTERVAL steps, reading
+the clock and the resource usage on every instruction would be too
+expensive.
+"""
+
+from resource import getrusage, RUSAGE_SELF
+from time import perf_counter
+
+# the number of steps between checks of time and memory
+CHECK_INTERVAL = 256
+
+
+def peak_memory():
+    """ Get the peak resident set size of the process in kilobytes """
+    # ru_maxrss is in kilobytes on Linux
+    return getrusage(RUSAGE_SELF).ru_maxrss
+
+
+class Budget:
+    TIME = 'time'
+    MEMORY = 'memory'
+    PATHS = 'paths'
+
+    def __init__(self, time=None, memory=None, paths=None, depth=None,
+                 solver_timeout=None):
+        # seconds
+        self.time = time
+        # kilobytes
+        self.memory = memory
+        self.paths = paths
+        self.depth = depth
+        # seconds
+        self.solver_timeout = solver_timeout
+        self._start = None
+        self._steps = 0
+
+    def start(self):
+        self._start = perf_counter()
+        self._steps = 0
+
+    def elapsed(self):
+        return 0 if self._start is None else perf_counter() - self._start
+
+    def exhausted(self, executor):
+        """ Get the exhausted resource (TIME, MEMORY, PATHS) or None """
+        if self.paths is not None and executor.executed_paths >= self.paths:
+            return Budget.PATHS
+        self._steps += 1
+        if self._steps % CHECK_INTERVAL:
+            return None
+        if self.time is not None and self.elapsed() >= self.time:
+            return Budget.TIME
+        if self.memory is not None and peak_memory() >= self.memory:
+            return Budget.MEMORY
+        return None
+
+    def too_deep(self, state):
+        """ Is the path of the state deeper than the bound? """
+        return self.depth is not None and len(state.constraints) > self.depth
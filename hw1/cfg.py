@@ -0,0 +1,142 @@
+"""
+Control flow graph of a program and analyses over it: reverse postorder,
+dominators and natural loops.
+"""
+
+from language import Instruction
+
+
+class Loop:
+    """ Natural loop: the header and all the blocks of the loop """
+
+    def __init__(self, header):
+        self.header = header
+        self.blocks = {header}
+        # blocks with a back edge to the header
+        self.latches = []
+
+    def __repr__(self):
+        return "loop {0}: {1}".format(self.header.get_name(),
+                                     " ".join(b.get_name() for b in self.blocks))
+
+
+class ControlFlowGraph:
+    def __init__(self, program):
+        self.program = program
+        self.entry = program.get_entry()
+        self.successors = {}
+        self.predecessors = {blk: [] for blk in program}
+        for blk in program:
+            succs = self._block_successors(blk)
+            self.successors[blk] = succs
+            for succ in succs:
+                self.predecessors[succ].append(blk)
+
+        # reachable blocks in reverse postorder
+        self.rpo = self._reverse_postorder()
+        self.rpo_index = {blk: idx for idx, blk in enumerate(self.rpo)}
+        self.idom = self._dominators()
+        self.loops = self._natural_loops()
+
+    def _block_successors(self, blk):
+        """ Get the successors of the block, the block ends with the first
+        jump or halt instruction or by falling through its end """
+        for instruction in blk:
+            ty = instruction.get_ty()
+            if ty == Instruction.HALT:
+                return []
+            if ty == Instruction.JUMP:
+                t, f = instruction.get_operands()
+                cond = instruction.get_condition()
+                if not isinstance(cond, Instruction):
+                    return [t if cond else f]
+                return [t] if t is f else [t, f]
+        return []
+
+    def _reverse_postorder(self):
+        order = []
+        visited = {self.entry}
+        stack = [(self.entry, iter(self.successors[self.entry]))]
+        while stack:
+            blk, succs = stack[-1]
+            for succ in succs:
+                if succ not in visited:
+                    visited.add(succ)
+                    stack.append((succ, iter(self.successors[succ])))
+                    break
+            else:
+                stack.pop()
+                order.append(blk)
+        order.reverse()
+        return order
+
+    def _dominators(self):
+        """ Compute immediate dominators (Cooper, Harvey, Kennedy) """
+        idom = {self.entry: self.entry}
+        index = self.rpo_index
+
+        def intersect(a, b):
+            while a is not b:
+                while index[a] > index[b]:
+                    a = idom[a]
+                while index[b] > index[a]:
+                    b = idom[b]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for blk in self.rpo[1:]:
+                preds = [p for p in self.predecessors[blk] if p in idom]
+                new = preds[0]
+                for p in preds[1:]:
+                    new = intersect(p, new)
+                if idom.get(blk) is not new:
+                    idom[blk] = new
+                    changed = True
+        return idom
+
+    def dominates(self, a, b):
+        """ Does the block a dominate the block b? """
+        if b not in self.idom:
+            return False
+        while b is not a:
+            if b is self.entry:
+                return False
+            b = self.idom[b]
+        return True
+
+    def _natural_loops(self):
+        loops = {}
+        for blk in self.rpo:
+            for succ in self.successors[blk]:
+                if not self.dominates(succ, blk):
+                    continue
+                # blk -> succ is a back edge
+                loop = loops.get(succ)
+                if loop is None:
+                    loop = loops[succ] = Loop(succ)
+                loop.latches.append(blk)
+                stack = [blk]
+                while stack:
+                    b = stack.pop()
+                    if b in loop.blocks:
+                        continue
+                    loop.blocks.add(b)
+                    stack.extend(p for p in self.predecessors[b]
+                                 if p in self.rpo_index)
+        return list(loops.values())
+
+    def loop_headers(self):
+        """ Get the set of headers of natural loops """
+        return {loop.header for loop in self.loops}
+
+    def loop_blocks(self):
+        """ Get the set of blocks that are in some natural loop """
+        blocks = set()
+        for loop in self.loops:
+            blocks |= loop.blocks
+        return blocks
+
+    def is_reachable(self, blk):
+        return blk in self.rpo_index
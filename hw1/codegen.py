@@ -0,0 +1,232 @@
+"""
+Compilation of programs to native Python functions.
+
+Every block of the program is turned into a Python function that
+takes the variables (V) and the registers (R) of the execution and
+returns the index of the successor block (or None when the execution
+ends). Instructions become Python locals, values that are used
+in other blocks are written through to the register file.
+The generated module is compiled once with compile() and the program
+is then run by a tight block trampoline.
+"""
+
+from language import Instruction, Cmp
+from interpreter import Interpreter
+
+OPERATORS = {
+    Instruction.ADD: '+',
+    Instruction.SUB: '-',
+    Instruction.MUL: '*',
+    Instruction.DIV: '/',
+}
+
+PREDICATES = {
+    Cmp.LT: '<',
+    Cmp.LE: '<=',
+    Cmp.GT: '>',
+    Cmp.GE: '>=',
+    Cmp.EQ: '==',
+    Cmp.NE: '!=',
+}
+
+
+def _error(msg):
+    raise RuntimeError(f"Execution error: {msg}")
+
+
+def _check_condition(condval):
+    assert condval in [True, False], f"Invalid condition: {condval}"
+
+
+class CodeGenerator:
+    """ Generates Python source code for a program """
+
+    def __init__(self, program):
+        self.program = program
+        self._blocks = list(program)
+        self._index = {blk: idx for idx, blk in enumerate(self._blocks)}
+        # values that are used outside of their block must
+        # be kept in the register file
+        self._escaping = set()
+        for blk in self._blocks:
+            for instruction in blk:
+                for op in self._uses(instruction):
+                    if isinstance(op, Instruction) and\
+                       op.get_block() is not blk:
+                        self._escaping.add(op)
+
+        self._lines = []
+        # values available as Python locals in the current block
+        self._locals = set()
+
+    def _uses(self, instruction):
+        if instruction.get_ty() == Instruction.JUMP:
+            return [instruction.get_condition()]
+        return instruction.get_operands()
+
+    def _emit(self, line, indent=1):
+        self._lines.append("    " * indent + line)
+
+    def _name(self, instruction):
+        return f"v{instruction.get_id()}"
+
+    def _operand(self, op):
+        """
+        Get the expression for the operand, fetch it from the register
+        file first if it was computed in another block
+        """
+        if not isinstance(op, Instruction):
+            return repr(op)
+        name = self._name(op)
+        if op not in self._locals:
+            self._fetch(op)
+        return name
+
+    def _fetch(self, op, before=None):
+        name = self._name(op)
+        self._emit(f"{name} = R[{op.get_slot()}]")
+        self._emit(f"if {name} is None:")
+        if before:
+            # print what we have so far, as the interpreter does
+            self._emit(f"print({', '.join(before)})", 2)
+        self._emit(f"_error({repr(f'Using unknown value: {op}')})", 2)
+        self._locals.add(op)
+
+    def _define(self, instruction, expr, check=None):
+        name = self._name(instruction)
+        self._emit(f"{name} = {expr}")
+        if check:
+            self._emit(f"if {name} is None:")
+            self._emit(f"_error({repr(check)})", 2)
+        if instruction in self._escaping:
+            self._emit(f"R[{instruction.get_slot()}] = {name}")
+        self._locals.add(instruction)
+
+    def _successor(self, blk):
+        return self._index[blk]
+
+    def _instruction(self, instruction):
+        ty = instruction.get_ty()
+        self._emit(f"# {instruction}")
+        if ty in OPERATORS:
+            a = self._operand(instruction.get_operand(0))
+            b = self._operand(instruction.get_operand(1))
+            if ty == Instruction.DIV:
+                self._emit(f"if {b} == 0:")
+                self._emit(f"_error({repr(f'Division by 0: {instruction}')})",
+                           2)
+            self._define(instruction, f"{a} {OPERATORS[ty]} {b}")
+        elif ty == Instruction.CMP:
+            a = self._operand(instruction.get_operand(0))
+            b = self._operand(instruction.get_operand(1))
+            pred = PREDICATES[instruction.get_predicate()]
+            self._define(instruction, f"{a} {pred} {b}")
+        elif ty == Instruction.LOAD:
+            var = instruction.get_operand(0)
+            msg = f"Reading uninitialied variable: {var.get_name()}"
+            self._define(instruction, f"V[{var.get_slot()}]", msg)
+        elif ty == Instruction.STORE:
+            val = self._operand(instruction.get_operand(0))
+            var = instruction.get_operand(1)
+            self._emit(f"V[{var.get_slot()}] = {val}")
+        elif ty == Instruction.PRINT:
+            vals = []
+            for op in instruction.get_operands():
+                if isinstance(op, Instruction) and op not in self._locals:
+                    self._fetch(op, vals)
+                vals.append(self._operand(op))
+            if vals:
+                self._emit(f"print({', '.join(vals)})")
+        elif ty == Instruction.ASSERT:
+            cond = instruction.get_condition()
+            msg = repr(f'Assertion failed: {instruction}')
+            if not isinstance(cond, Instruction):
+                if cond is False:
+                    self._emit(f"_error({msg})")
+                return
+            cond = self._operand(cond)
+            self._emit(f"if {cond} is not True:")
+            self._emit(f"_check_condition({cond})", 2)
+            self._emit(f"if {cond} is False:", 2)
+            self._emit(f"_error({msg})", 3)
+        elif ty == Instruction.JUMP:
+            t = self._successor(instruction.get_operand(0))
+            f = self._successor(instruction.get_operand(1))
+            cond = instruction.get_condition()
+            if not isinstance(cond, Instruction):
+                self._emit(f"return {t if cond else f}")
+                return
+            condval = self._operand(cond)
+            if cond.get_ty() != Instruction.CMP:
+                self._emit(f"_check_condition({condval})")
+            self._emit(f"return {t} if {condval} else {f}")
+        elif ty == Instruction.HALT:
+            self._emit("return None")
+        else:
+            raise RuntimeError(f"Unimplemented instruction: {instruction}")
+
+    def _block(self, idx, blk):
+        self._locals = set()
+        self._lines.append(f"def block_{idx}(V, R):")
+        self._emit(f"# block {blk.get_name()}")
+        for instruction in blk:
+            self._instruction(instruction)
+            if instruction.get_ty() in (Instruction.JUMP, Instruction.HALT):
+                break
+        else:
+            # fall through the end of the block
+            self._emit("return None")
+        self._lines.append("")
+
+    def generate(self):
+        """ Generate the source code of the program """
+        self._lines = []
+        for idx, blk in enumerate(self._blocks):
+            self._block(idx, blk)
+
+        blocks = ", ".join(f"block_{idx}" for idx in range(len(self._blocks)))
+        self._lines.append(f"BLOCKS = ({blocks},)")
+        self._lines.append("")
+        self._lines.append("def run(V, R):")
+        if self._blocks:
+            self._emit("b = 0")
+            self._emit("while b is not None:")
+            self._emit("b = BLOCKS[b](V, R)", 2)
+        else:
+            self._emit("return None")
+        return "\n".join(self._lines) + "\n"
+
+
+class CompiledInterpreter(Interpreter):
+    """ Interpreter that runs the program compiled to Python functions """
+
+    def __init__(self, program):
+        super().__init__(program)
+        generator = CodeGenerator(program)
+        self.source = generator.generate()
+
+        namespace = {
+            '_error': _error,
+            '_check_condition': _check_condition,
+        }
+        exec(compile(self.source, "<compiled program>", 'exec'), namespace)
+        self._run = namespace['run']
+
+    def run(self):
+        self._run([None] * self.program.get_variables_num(),
+                  [None] * self.program.get_values_num())
+
+
+# debugging...
+if __name__ == "__main__":
+    from parser import Parser
+    from sys import argv
+    if len(argv) != 2:
+        print(f"Wrong numer of arguments, usage: {argv[0]} <program>")
+        exit(1)
+    parser = Parser(argv[1])
+    program = parser.parse()
+    if program is None:
+        print("Program parsing failed!")
+        exit(1)
+    print(CodeGenerator(program).generate())
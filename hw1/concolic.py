@@ -0,0 +1,303 @@
+#!/usr/bin/python3
+
+"""
+Concolic execution.
+
+The program is run concretely with the semantics of the Interpreter.
+Every value also has a symbolic shadow, the expression over the inputs
+(variables read before they are written, as in the symbolic executor)
+that computed it. Values that do not depend on the inputs have no
+shadow (None), so the concrete parts of the program cost nothing extra.
+Jumps and assertions on symbolic conditions record constraints, the
+list of the constraints of a run is its path condition.
+
+New inputs are found by the generational search: for a run with
+the path condition c1, ..., cn, the solver is asked for inputs that
+satisfy c1, ..., c(i-1), Not(ci) for every i, so one run gives a whole
+generation of new inputs. A child of the negation of ci negates only
+constraints after ci, so no path is explored twice. Pending inputs
+whose negated branch (the jump and the side of it, or the failure of
+the assertion) was not covered by any run yet go first.
+
+Only one path is kept in memory at a time and the constraints of a run
+are asserted into the solver incrementally, one push() per run and one
+add() per constraint, with the negated constraint passed as an assumption,
+so every new input costs one incremental query.
+"""
+
+from heapq import heappush, heappop
+
+from z3 import Solver, Int, IntVal, BoolVal, Not, sat, simplify, \
+               is_true, is_false, Z3Exception
+
+from language import Instruction, Cmp
+from interpreter import ExecutionState, Interpreter
+from expressions import smt_div
+
+_ARITH = {
+    Instruction.ADD: lambda a, b: a + b,
+    Instruction.SUB: lambda a, b: a - b,
+    Instruction.MUL: lambda a, b: a * b,
+    Instruction.DIV: lambda a, b: a / b,
+}
+
+_PREDICATES = {
+    Cmp.LT: lambda a, b: a < b,
+    Cmp.LE: lambda a, b: a <= b,
+    Cmp.GT: lambda a, b: a > b,
+    Cmp.GE: lambda a, b: a >= b,
+    Cmp.EQ: lambda a, b: a == b,
+    Cmp.NE: lambda a, b: a != b,
+}
+
+
+def _const(v):
+    # bool must go before int, True and False are ints too
+    if isinstance(v, bool):
+        return BoolVal(v)
+    return IntVal(v)
+
+
+class ConcolicExecutionState(ExecutionState):
+    def __init__(self, pc, variables_num=0, values_num=0, inputs=None):
+        super().__init__(pc, variables_num, values_num)
+        # symbolic shadows of variables and values, None for concrete ones
+        self.symvariables = [None] * variables_num
+        self.symvalues = [None] * values_num
+        # name of input variable -> its concrete value
+        self.inputs = inputs or {}
+        # path condition, list of (instruction, side, constraint)
+        self.trace = []
+
+    def symbolic(self, v):
+        """ Get the symbolic shadow of the operand, None if it is concrete """
+        if isinstance(v, Instruction):
+            return self.symvalues[v.get_slot()]
+        return None
+
+    def shadow(self, v):
+        """ Get the expression for the operand """
+        sym = self.symbolic(v)
+        return _const(self.eval(v)) if sym is None else sym
+
+
+class ConcolicExecutor(Interpreter):
+    def __init__(self, program, max_runs=None):
+        super().__init__(program)
+        self.max_runs = max_runs
+        self.solver = Solver()
+        self.executed_paths = 0
+        self.errors = 0
+        self.solver_calls = 0
+        # runs that did not follow the path their inputs were solved for
+        self.diverged = 0
+        # pairs (instruction, side) taken by some run
+        self.covered = set()
+
+    def _shadow(self, state, instruction, compute, *ops):
+        """
+        Set the shadow of the value of the instruction, compute takes
+        the expressions for the operands
+        """
+        if all(state.symbolic(op) is None for op in ops):
+            sym = None
+        else:
+            try:
+                sym = compute(*(state.shadow(op) for op in ops))
+            except Z3Exception:
+                # mixing of booleans and integers, go on concretely
+                sym = None
+        state.symvalues[instruction.get_slot()] = sym
+
+    def executeMem(self, state):
+        instruction = state.pc
+        op = instruction.get_operand(0)
+        if instruction.get_ty() == Instruction.LOAD:
+            if state.read(op) is None:
+                name = op.get_name()
+                state.set(instruction, state.inputs.get(name, 0))
+                state.symvalues[instruction.get_slot()] = Int(name)
+            else:
+                state = super().executeMem(state)
+                state.symvalues[instruction.get_slot()] =\
+                    state.symvariables[op.get_slot()]
+            return state
+
+        state = super().executeMem(state)
+        if not state.error:
+            state.symvariables[instruction.get_operand(1).get_slot()] =\
+                state.symbolic(op)
+        return state
+
+    def executeArith(self, state):
+        instruction = state.pc
+        ty = instruction.get_ty()
+        a, b = instruction.get_operands()
+        aval, bval = state.eval(a), state.eval(b)
+        if ty == Instruction.DIV and aval is not None and\
+           bval is not None and bval != 0:
+            # divide as the solver does, so that the concrete run
+            # follows the path condition
+            state.set(instruction, smt_div(aval, bval))
+        else:
+            state = super().executeArith(state)
+        if not state.error:
+            self._shadow(state, instruction, _ARITH[ty], a, b)
+        return state
+
+    def executeCmp(self, state):
+        instruction = state.pc
+        state = super().executeCmp(state)
+        if not state.error:
+            self._shadow(state, instruction,
+                         _PREDICATES[instruction.get_predicate()],
+                         *instruction.get_operands())
+        return state
+
+    def _record(self, state, instruction, side, constraint):
+        constraint = simplify(constraint)
+        if not (is_true(constraint) or is_false(constraint)):
+            state.trace.append((instruction, side, constraint))
+        self.covered.add((instruction, side))
+
+    def executeJump(self, state):
+        jump = state.pc
+        cond = jump.get_condition()
+        sym = state.symbolic(cond)
+        condval = state.eval(cond)
+        state = super().executeJump(state)
+        if not state.error and sym is not None:
+            self._record(state, jump, bool(condval),
+                         sym if condval else Not(sym))
+        return state
+
+    def executeAssert(self, state):
+        instruction = state.pc
+        cond = instruction.get_condition()
+        if state.eval(cond) is None:
+            state.error = f"Using unknown value: {cond}"
+            return state
+        sym = state.symbolic(cond)
+        if sym is not None:
+            condval = bool(state.eval(cond))
+            self._record(state, instruction, condval,
+                         sym if condval else Not(sym))
+        return super().executeAssert(state)
+
+    def execute(self, inputs):
+        """ Run the program on the inputs, return the final state """
+        entryblock = self.program.get_entry()
+        state = ConcolicExecutionState(entryblock[0],
+                                       self.program.get_variables_num(),
+                                       self.program.get_values_num(),
+                                       inputs)
+        # the instructions modify the state in place
+        current = state
+        while current:
+            current = self.executeInstruction(current)
+            if current and current.error:
+                break
+        return state
+
+    def expand(self, state, bound):
+        """
+        Get the children of the run: the list of (i, inputs) where inputs
+        satisfy the path condition of the run up to the i-th constraint
+        and the negation of the i-th constraint
+        """
+        solver = self.solver
+        children = []
+        solver.push()
+        for i, (_, _, constraint) in enumerate(state.trace):
+            if i >= bound:
+                self.solver_calls += 1
+                if solver.check(Not(constraint)) == sat:
+                    model = solver.model()
+                    inputs = dict(state.inputs)
+                    for decl in model.decls():
+                        inputs[decl.name()] = model[decl].as_long()
+                    children.append((i, inputs))
+            solver.add(constraint)
+        solver.pop()
+        return children
+
+    def _priority(self, site):
+        return 1 if site in self.covered else 0
+
+    def run(self):
+        # (priority, order, inputs, bound, expected path)
+        pending = [(0, 0, {}, 0, None)]
+        order = 0
+        runs = 0
+        while pending:
+            if self.max_runs is not None and runs >= self.max_runs:
+                break
+            priority, _, inputs, bound, expected = heappop(pending)
+            site = expected[-1] if expected else None
+            if site is not None and self._priority(site) != priority:
+                # the branch was covered since the inputs were found
+                order += 1
+                heappush(pending, (self._priority(site), order, inputs,
+                                   bound, expected))
+                continue
+
+            runs += 1
+            state = self.execute(inputs)
+            self.executed_paths += 1
+            if state.error:
+                self.errors += 1
+                inputs_str = ", ".join(f"{n}={v}" for n, v in
+                                       sorted(state.inputs.items()))
+                print(f"Error: {state.error} (inputs: {inputs_str})")
+
+            path = [(inst, side) for inst, side, _ in state.trace]
+            if expected is not None and path[:len(expected)] != expected:
+                self.diverged += 1
+
+            for i, child in self.expand(state, bound):
+                inst, side = path[i]
+                expected = path[:i] + [(inst, not side)]
+                order += 1
+                heappush(pending, (self._priority(expected[-1]), order,
+                                   child, i + 1, expected))
+
+        print(f"Executed paths: {self.executed_paths}")
+        print(f"Error paths: {self.errors}")
+        print(f"Solver calls: {self.solver_calls}")
+        if self.diverged:
+            print(f"Diverged runs: {self.diverged}")
+        if pending:
+            print(f"Pending inputs: {len(pending)}")
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from parser import Parser
+    from ircache import load_program
+    from optimizer import PassManager
+
+    argparser = ArgumentParser()
+    argparser.add_argument('--max-runs', type=int, default=None,
+                           metavar='N',
+                           help='stop after N concrete runs')
+    argparser.add_argument('--ir-cache', action='store_true',
+                           help='load the parsed program from a cache file '
+                                'next to it (PROGRAM.irc), create the file '
+                                'if it is missing or outdated')
+    argparser.add_argument('-O', '--optimize', action='store_true',
+                           help='optimize the program before running it')
+    argparser.add_argument('program')
+    args = argparser.parse_args()
+
+    if args.ir_cache:
+        program = load_program(args.program)
+    else:
+        program = Parser(args.program).parse()
+    if program is None:
+        print("Program parsing failed!")
+        exit(1)
+    if args.optimize:
+        PassManager().run(program)
+
+    I = ConcolicExecutor(program, args.max_runs)
+    exit(I.run())
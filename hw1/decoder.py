@@ -0,0 +1,239 @@
+"""
+Pre-decoded execution engine for the interpreter.
+
+The program is translated once into a chain of handler closures
+with operands already resolved (constants are inlined, predicates
+and arithmetic are bound to the functions from the operator module),
+so that executing an instruction is a single call. Every handler
+takes the variables and values of the state and returns the handler
+of the next instruction, or None when the execution ends.
+"""
+
+from operator import add, sub, mul, lt, le, gt, ge, eq, ne
+from language import Instruction, Cmp
+from interpreter import ExecutionState, Interpreter
+
+ARITHMETIC = {
+    Instruction.ADD: add,
+    Instruction.SUB: sub,
+    Instruction.MUL: mul,
+}
+
+PREDICATES = {
+    Cmp.LT: lt,
+    Cmp.LE: le,
+    Cmp.GT: gt,
+    Cmp.GE: ge,
+    Cmp.EQ: eq,
+    Cmp.NE: ne,
+}
+
+
+def _error(msg):
+    raise RuntimeError(f"Execution error: {msg}")
+
+
+def _unknown(op):
+    _error(f"Using unknown value: {op}")
+
+
+class Decoder:
+    """ Translates a program into handler closures """
+
+    def __init__(self, program):
+        self.program = program
+        self._blocks = list(program)
+        self._index = {blk: idx for idx, blk in enumerate(self._blocks)}
+        # handlers of the first instructions of blocks, filled in
+        # by decode() and looked up by jumps at run-time
+        self.entries = [None] * len(self._blocks)
+
+    def decode(self):
+        """ Decode the whole program, return the entry handler """
+        for idx, blk in enumerate(self._blocks):
+            self.entries[idx] = self._decode_block(blk)
+        return self.entries[0] if self.entries else None
+
+    def _decode_block(self, blk):
+        # decode backwards, so that the successor of every
+        # instruction is already known
+        nxt = None
+        for instruction in reversed(list(blk)):
+            nxt = self._decode_instruction(instruction, nxt)
+        return nxt
+
+    def _decode_instruction(self, instruction, nxt):
+        ty = instruction.get_ty()
+        if ty in ARITHMETIC:
+            return self._binary(instruction, ARITHMETIC[ty], nxt)
+        if ty == Instruction.DIV:
+            def div(a, b):
+                if b == 0:
+                    _error(f"Division by 0: {instruction}")
+                return a / b
+            return self._binary(instruction, div, nxt)
+        if ty == Instruction.CMP:
+            return self._binary(instruction,
+                                PREDICATES[instruction.get_predicate()], nxt)
+        if ty == Instruction.LOAD:
+            return self._load(instruction, nxt)
+        if ty == Instruction.STORE:
+            return self._store(instruction, nxt)
+        if ty == Instruction.JUMP:
+            return self._jump(instruction)
+        if ty == Instruction.PRINT:
+            return self._print(instruction, nxt)
+        if ty == Instruction.ASSERT:
+            return self._assert(instruction, nxt)
+        if ty == Instruction.HALT:
+            return lambda variables, values: None
+        raise RuntimeError(f"Unimplemented instruction: {instruction}")
+
+    def _binary(self, instruction, fun, nxt):
+        a, b = instruction.get_operands()
+        slot = instruction.get_slot()
+        if isinstance(a, Instruction) and isinstance(b, Instruction):
+            sa, sb = a.get_slot(), b.get_slot()
+
+            def handler(variables, values):
+                x = values[sa]
+                if x is None:
+                    _unknown(a)
+                y = values[sb]
+                if y is None:
+                    _unknown(b)
+                values[slot] = fun(x, y)
+                return nxt
+        elif isinstance(a, Instruction):
+            sa = a.get_slot()
+
+            def handler(variables, values):
+                x = values[sa]
+                if x is None:
+                    _unknown(a)
+                values[slot] = fun(x, b)
+                return nxt
+        elif isinstance(b, Instruction):
+            sb = b.get_slot()
+
+            def handler(variables, values):
+                y = values[sb]
+                if y is None:
+                    _unknown(b)
+                values[slot] = fun(a, y)
+                return nxt
+        else:
+            def handler(variables, values):
+                values[slot] = fun(a, b)
+                return nxt
+        return handler
+
+    def _load(self, instruction, nxt):
+        var = instruction.get_operand(0)
+        varslot, slot = var.get_slot(), instruction.get_slot()
+
+        def handler(variables, values):
+            value = variables[varslot]
+            if value is None:
+                _error(f"Reading uninitialied variable: {var.get_name()}")
+            values[slot] = value
+            return nxt
+        return handler
+
+    def _store(self, instruction, nxt):
+        op, var = instruction.get_operands()
+        varslot = var.get_slot()
+        if isinstance(op, Instruction):
+            opslot = op.get_slot()
+
+            def handler(variables, values):
+                value = values[opslot]
+                if value is None:
+                    _unknown(op)
+                variables[varslot] = value
+                return nxt
+        else:
+            def handler(variables, values):
+                variables[varslot] = op
+                return nxt
+        return handler
+
+    def _jump(self, instruction):
+        entries = self.entries
+        t = self._index[instruction.get_operand(0)]
+        f = self._index[instruction.get_operand(1)]
+        cond = instruction.get_condition()
+        if isinstance(cond, Instruction):
+            condslot = cond.get_slot()
+
+            def handler(variables, values):
+                condval = values[condslot]
+                if condval is None:
+                    _unknown(cond)
+                assert condval in [True, False], \
+                    f"Invalid condition: {condval}"
+                return entries[t] if condval else entries[f]
+        else:
+            target = t if cond else f
+
+            def handler(variables, values):
+                return entries[target]
+        return handler
+
+    def _print(self, instruction, nxt):
+        operands = [(op, op.get_slot()) if isinstance(op, Instruction)
+                    else (op, None) for op in instruction.get_operands()]
+
+        def handler(variables, values):
+            vals = []
+            for op, opslot in operands:
+                val = op if opslot is None else values[opslot]
+                if val is None:
+                    # print what we have so far, as the interpreter does
+                    if vals:
+                        print(" ".join(map(str, vals)))
+                    _unknown(op)
+                vals.append(val)
+            if vals:
+                print(" ".join(map(str, vals)))
+            return nxt
+        return handler
+
+    def _assert(self, instruction, nxt):
+        cond = instruction.get_condition()
+        if isinstance(cond, Instruction):
+            condslot = cond.get_slot()
+
+            def handler(variables, values):
+                condval = values[condslot]
+                if condval is None:
+                    _unknown(cond)
+                assert condval in [True, False], \
+                    f"Invalid condition: {condval}"
+                if condval is False:
+                    _error(f"Assertion failed: {instruction}")
+                return nxt
+        elif cond is False:
+            def handler(variables, values):
+                _error(f"Assertion failed: {instruction}")
+        else:
+            def handler(variables, values):
+                return nxt
+        return handler
+
+
+class DecodedInterpreter(Interpreter):
+    """ Interpreter that runs the pre-decoded form of the program """
+
+    def __init__(self, program):
+        super().__init__(program)
+        self.entry = Decoder(program).decode()
+
+    def run(self):
+        state = ExecutionState(None, self.program.get_variables_num(),
+                               self.program.get_values_num())
+        variables, values = state.variables, state.values
+
+        handler = self.entry
+        while handler is not None:
+            handler = handler(variables, values)
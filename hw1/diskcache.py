@@ -0,0 +1,166 @@
+"""
+Persistent cache of solver queries.
+
+Results of queries are kept in an SQLite database, so they survive
+across runs of the executor (and are shared by its parallel workers).
+A query (a set of constraints) is keyed by the SHA-256 hash of its
+normalized SMT-LIB form: the hashes of the s-expressions of its
+constraints, without duplicates and sorted, so the key does not depend
+on the order of the constraints nor on ids of expressions, which
+differ between runs. The theory of the expressions (integers or
+bit-vectors of a width) is a part of the key too, the s-expressions
+do not declare the symbols, so (= x y) is the same for both. Sat results are stored with the model (the values
+of the symbols of the query).
+
+The cache keeps at most the given number of entries, the least recently
+used entries are evicted. Writes (new entries and the times of uses
+of old ones) are buffered and written in one transaction when the
+buffer is full and when the cache is closed.
+"""
+
+import json
+import sqlite3
+from hashlib import sha256
+
+from z3 import Int, Bool, BitVec, IntVal, BoolVal, BitVecVal, \
+               is_int_value, is_bv_value, is_true, is_false
+
+from assignment import Assignment
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    key TEXT PRIMARY KEY,
+    sat INTEGER NOT NULL,
+    model TEXT,
+    used INTEGER NOT NULL
+)
+"""
+
+
+def _encode_model(model):
+    """ Get the JSON form of an assignment, None if it cannot be stored """
+    values = []
+    for symbol, value in model.pairs():
+        if is_int_value(value):
+            values.append([symbol.decl().name(), 'int', value.as_long()])
+        elif is_bv_value(value):
+            values.append([symbol.decl().name(), f"bv{value.size()}",
+                           value.as_long()])
+        elif is_true(value) or is_false(value):
+            values.append([symbol.decl().name(), 'bool', is_true(value)])
+        else:
+            return None
+    return json.dumps(values)
+
+
+def _decode_model(text):
+    pairs = []
+    for name, sort, value in json.loads(text):
+        if sort == 'int':
+            pairs.append((Int(name), IntVal(value)))
+        elif sort.startswith('bv'):
+            width = int(sort[2:])
+            pairs.append((BitVec(name, width), BitVecVal(value, width)))
+        else:
+            pairs.append((Bool(name), BoolVal(value)))
+    return Assignment.from_pairs(pairs)
+
+
+class DiskQueryCache:
+    def __init__(self, path, size=100000, flush_every=256, theory='int'):
+        self._size = size
+        # queries of runs with different theories never share entries
+        self._theory = theory
+        self._flush_every = flush_every
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+        (last,) = self._db.execute(
+            "SELECT COALESCE(MAX(used), 0) FROM queries").fetchone()
+        # logical clock for the LRU order
+        self._clock = last
+        # id of expression -> (expression, hash of its s-expression),
+        # we keep the expression so that its id is not reused
+        self._hashes = {}
+        # buffered writes: key -> (sat, model, used) for new entries
+        # and key -> used for hits
+        self._new = {}
+        self._used = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _hash(self, expr):
+        eid = expr.get_id()
+        cached = self._hashes.get(eid)
+        if cached is None:
+            if len(self._hashes) >= 65536:
+                self._hashes.clear()
+            cached = (expr, sha256(expr.sexpr().encode()).hexdigest())
+            self._hashes[eid] = cached
+        return cached[1]
+
+    def key(self, query):
+        """ Get the key of the query (a list of constraints) """
+        hashes = sorted({self._hash(c) for c in query})
+        return sha256(" ".join([self._theory, *hashes])
+                      .encode()).hexdigest()
+
+    def lookup(self, query):
+        """
+        Get the stored result of the query, the pair (True, model)
+        for sat, (False, None) for unsat and None if it is not stored.
+        The model may be None.
+        """
+        key = self.key(query)
+        self._clock += 1
+        entry = self._new.get(key)
+        if entry is None:
+            entry = self._db.execute(
+                "SELECT sat, model, used FROM queries WHERE key = ?",
+                (key,)).fetchone()
+            if entry is None:
+                self.misses += 1
+                return None
+            self._used[key] = self._clock
+            self._maybe_flush()
+        else:
+            self._new[key] = (entry[0], entry[1], self._clock)
+        self.hits += 1
+        sat, model, _ = entry
+        if not sat:
+            return False, None
+        return True, None if model is None else _decode_model(model)
+
+    def store(self, query, result, model=None):
+        """ Store the result (True for sat, False for unsat) of the query """
+        self._clock += 1
+        encoded = None if model is None else _encode_model(model)
+        self._new[self.key(query)] = (int(result), encoded, self._clock)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._new) + len(self._used) >= self._flush_every:
+            self.flush()
+
+    def flush(self):
+        """ Write the buffered entries and evict the old ones """
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?)",
+                [(k, *v) for k, v in self._new.items()])
+            self._db.executemany(
+                "UPDATE queries SET used = MAX(used, ?) WHERE key = ?",
+                [(used, k) for k, used in self._used.items()])
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM queries").fetchone()
+            if count > self._size:
+                self._db.execute(
+                    "DELETE FROM queries WHERE key IN (SELECT key FROM "
+                    "queries ORDER BY used LIMIT ?)", (count - self._size,))
+        self._new.clear()
+        self._used.clear()
+
+    def close(self):
+        self.flush()
+        self._db.close()
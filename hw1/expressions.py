@@ -0,0 +1,218 @@
+"""
+Construction of expressions of the symbolic executor.
+
+Building a z3 expression from Python is expensive (the operands are
+coerced, the C API is called and a new Python wrapper is allocated),
+even though z3 hash-conses the expressions themselves. The executor
+builds the same expressions again and again: constant operands
+on every evaluation, the same arithmetic and comparisons in every
+iteration of a loop with concrete values and in every forked state.
+ExpressionFactory keeps tables of the constants, symbols and nodes
+(the operation and the ids of the operands) it has built, so every
+expression is built only once and the same Python object is returned
+for it.
+
+Nodes are simplified locally before they reach z3: operations
+on constants are folded (with the semantics of z3, see smt_div),
+neutral and absorbing operands are dropped (x + 0, x * 1, x * 0, ...),
+and comparisons of an expression with itself and negations of
+constants are folded too. So concrete parts of programs stay concrete
+and the solver gets smaller terms.
+
+With a width, the factory builds bit-vector expressions instead
+of integer ones: constants and symbols are signed bit-vectors of the
+width, arithmetic wraps around and comparisons are signed (z3 gives
+these semantics to +, <, etc. on bit-vectors). Division follows
+the rule of integers (the remainder is never negative, see bv_div)
+rather than the signed division of bit-vectors, which rounds towards
+zero, so the two theories differ only when some value overflows
+(or when a symbolic divisor is zero, the theories give different
+values to such divisions).
+Constants are folded the same way. Bit-blasted queries are decidable
+and usually fast even when they multiply or divide symbols, which
+can make integer queries slow or unknown.
+
+The tables are cleared when they get full, the ids of expressions
+are stable as long as the expressions are alive, so entries keep
+their operands.
+"""
+
+from z3 import Int, IntVal, BitVec, BitVecVal, BoolVal, Not, If, SRem
+
+from language import Instruction, Cmp
+
+
+def smt_div(a, b):
+    """ Integer division of SMT-LIB (the remainder is never negative) """
+    r = a % abs(b)
+    return (a - r) // b
+
+
+def bv_div(a, b):
+    """
+    Division of bit-vector expressions with the rule of smt_div:
+    the signed division rounds towards zero, so the quotient
+    is corrected when the remainder is negative
+    """
+    q = a / b
+    return If(SRem(a, b) < 0, If(b > 0, q - 1, q + 1), q)
+
+
+# widths of bit-vectors that can be used
+WIDTHS = (8, 16, 32, 64)
+
+_FOLD_ARITH = {
+    Instruction.ADD: lambda a, b: a + b,
+    Instruction.SUB: lambda a, b: a - b,
+    Instruction.MUL: lambda a, b: a * b,
+    Instruction.DIV: smt_div,
+}
+
+_ARITH = {
+    **_FOLD_ARITH,
+    Instruction.DIV: lambda a, b: a / b,
+}
+
+_BV_ARITH = {
+    **_FOLD_ARITH,
+    Instruction.DIV: bv_div,
+}
+
+_PREDICATES = {
+    Cmp.LT: lambda a, b: a < b,
+    Cmp.LE: lambda a, b: a <= b,
+    Cmp.GT: lambda a, b: a > b,
+    Cmp.GE: lambda a, b: a >= b,
+    Cmp.EQ: lambda a, b: a == b,
+    Cmp.NE: lambda a, b: a != b,
+}
+
+# the value of a comparison of an expression with itself
+_REFLEXIVE = {
+    Cmp.LT: False, Cmp.LE: True, Cmp.GT: False,
+    Cmp.GE: True, Cmp.EQ: True, Cmp.NE: False,
+}
+
+
+class ExpressionFactory:
+    def __init__(self, width=None, size=65536):
+        # width of bit-vectors, None for integers
+        self.width = width
+        self._build = _ARITH if width is None else _BV_ARITH
+        self._size = size
+        # (type, value) -> constant, bools and ints must not share
+        # the entries, True == 1
+        self._constants = {}
+        # id of constant -> (constant, its value)
+        self._values = {}
+        # name -> symbol
+        self._symbols = {}
+        # (type of instruction[, predicate], ids of operands)
+        # or (Not, id of operand) -> (operands, expression)
+        self._nodes = {}
+        self.hits = 0
+        self.folded = 0
+
+    def theory(self):
+        """ Get the name of the theory of the expressions """
+        return 'int' if self.width is None else f"bv{self.width}"
+
+    def _wrap(self, v):
+        """ Get the signed value of v in the bit-vector of the width """
+        half = 1 << (self.width - 1)
+        return ((v + half) & ((half << 1) - 1)) - half
+
+    def const(self, v):
+        """ Get the constant expression of the Python int or bool """
+        if self.width is not None and not isinstance(v, bool):
+            v = self._wrap(v)
+        key = (type(v), v)
+        c = self._constants.get(key)
+        if c is not None:
+            return c
+        if len(self._constants) >= self._size:
+            self._constants.clear()
+            self._values.clear()
+        # bool must go before int, True and False are ints too
+        if isinstance(v, bool):
+            c = BoolVal(v)
+        elif self.width is None:
+            c = IntVal(v)
+        else:
+            c = BitVecVal(v, self.width)
+        self._constants[key] = c
+        self._values[c.get_id()] = (c, v)
+        return c
+
+    def symbol(self, name):
+        """ Get the integer (or bit-vector) symbol with the name """
+        s = self._symbols.get(name)
+        if s is None:
+            if self.width is None:
+                s = Int(name)
+            else:
+                s = BitVec(name, self.width)
+            self._symbols[name] = s
+        return s
+
+    def value(self, expr):
+        """ Get the Python value of a constant built here, None otherwise """
+        entry = self._values.get(expr.get_id())
+        return None if entry is None else entry[1]
+
+    def _node(self, key, operands, build):
+        entry = self._nodes.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+        if len(self._nodes) >= self._size:
+            self._nodes.clear()
+        expr = build()
+        self._nodes[key] = (operands, expr)
+        return expr
+
+    def arith(self, ty, a, b):
+        """ Get the expression a op b for the arithmetic instruction type """
+        x, y = self.value(a), self.value(b)
+        # no folding of bools, z3 does not add them either
+        if type(x) is int and type(y) is int and\
+           not (ty == Instruction.DIV and y == 0):
+            self.folded += 1
+            return self.const(_FOLD_ARITH[ty](x, y))
+        if y == 0 and type(y) is int:
+            if ty in (Instruction.ADD, Instruction.SUB):
+                return a
+            if ty == Instruction.MUL:
+                return b
+        if y == 1 and type(y) is int and\
+           ty in (Instruction.MUL, Instruction.DIV):
+            return a
+        if type(x) is int:
+            if x == 0 and ty == Instruction.ADD:
+                return b
+            if x == 0 and ty == Instruction.MUL:
+                return a
+            if x == 1 and ty == Instruction.MUL:
+                return b
+        return self._node((ty, a.get_id(), b.get_id()), (a, b),
+                          lambda: self._build[ty](a, b))
+
+    def cmp(self, predicate, a, b):
+        """ Get the comparison of a and b with the predicate """
+        x, y = self.value(a), self.value(b)
+        if x is not None and y is not None:
+            self.folded += 1
+            return self.const(bool(_PREDICATES[predicate](x, y)))
+        aid, bid = a.get_id(), b.get_id()
+        if aid == bid:
+            self.folded += 1
+            return self.const(_REFLEXIVE[predicate])
+        return self._node((Instruction.CMP, predicate, aid, bid), (a, b),
+                          lambda: _PREDICATES[predicate](a, b))
+
+    def negation(self, a):
+        """ Get Not(a) """
+        x = self.value(a)
+        if x is not None:
+            return self.const(not x)
+        return self._node((Not, a.get_id()), (a,), lambda: Not(a))
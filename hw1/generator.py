@@ -0,0 +1,205 @@
+"""
+Generator of synthetic programs.
+
+Programs are generated as structured code, so they are always valid
+and always terminate: a program is a sequence of statements, a statement
+is an arithmetic update (add, sub or mul) of a data variable,
+an if-then-else, a counting loop with a constant bound, or an assertion.
+The parameters are
+
+    blocks          the (minimal) number of blocks of the program
+    loop_depth      the maximal nesting of loops, 0 for no loops
+    nondet          the number of variables that are never written,
+                    their values are unknown (symbolic) inputs
+    branch_density  the probability that a statement is an if-then-else
+    assert_density  the probability that a statement is an assertion
+
+Data variables are initialized in the entry block and loop counters
+are separate variables, one per level of nesting, that the bodies
+of loops never write. Conditions of branches and assertions compare
+inputs or data variables with constants, so the symbolic executor
+forks on branches on inputs. Assertions check that the value is not
+equal to the constant, so they mostly hold, but some of them can fail.
+"""
+
+from random import Random
+
+
+class _Label:
+    """ Name of a block that is created later """
+
+    def __init__(self):
+        self.name = None
+
+    def __str__(self):
+        return self.name
+
+
+class ProgramGenerator:
+    # the number of data variables
+    DATA = 4
+    # the maximal number of iterations of a loop
+    MAX_TRIP = 4
+
+    def __init__(self, blocks=10, loop_depth=1, nondet=2,
+                 branch_density=0.2, assert_density=0.1, seed=None):
+        assert blocks >= 1 and loop_depth >= 0 and nondet >= 0
+        assert 0 <= branch_density <= 1 and 0 <= assert_density <= 1
+        self.target = blocks
+        self.loop_depth = loop_depth
+        self.nondet = nondet
+        self.branch_density = branch_density
+        self.assert_density = assert_density
+        self.random = Random(seed)
+
+    def _block(self, label=None):
+        """ Start a new block, bind the label to it """
+        name = f"b{len(self._blocks)}"
+        if label is not None:
+            label.name = name
+        self._blocks.append((name, []))
+
+    def _emit(self, *parts):
+        self._blocks[-1][1].append(parts)
+
+    def _value(self):
+        self._values += 1
+        return f"t{self._values}"
+
+    def _load(self, var):
+        val = self._value()
+        self._emit(val, '= load', var)
+        return val
+
+    def _operand(self):
+        """ Load an input or a data variable """
+        if self.nondet and self.random.random() < 0.5:
+            return self._load(f"n{self.random.randrange(self.nondet)}")
+        return self._load(f"v{self.random.randrange(self.DATA)}")
+
+    def _condition(self, preds=('lt', 'le', 'gt', 'ge', 'eq', 'ne')):
+        val = self._operand()
+        cond = self._value()
+        pred = self.random.choice(preds)
+        self._emit(cond, '= cmp', pred, val, self.random.randint(-10, 10))
+        return cond
+
+    def _update(self):
+        var = f"v{self.random.randrange(self.DATA)}"
+        a = self._operand()
+        res = self._value()
+        # no div, the Interpreter divides with / and gets floats
+        # (even for exact quotients), which the engines do not run
+        op = self.random.choice(['add', 'sub', 'mul'])
+        if self.random.random() < 0.5:
+            b = self._operand()
+        else:
+            b = self.random.randint(-5, 5)
+        self._emit(res, '=', op, a, b)
+        self._emit('store', res, 'to', var)
+
+    def _assert(self):
+        # assertions that mostly hold, so that runs do not stop early
+        self._emit('assert', self._condition(['ne']))
+
+    def _branch(self, depth):
+        then, other, join = _Label(), _Label(), _Label()
+        self._emit('jump', self._condition(), then, other)
+        self._block(then)
+        self._sequence(depth, 1)
+        self._emit('jump true', join, join)
+        self._block(other)
+        self._sequence(depth, 1)
+        self._emit('jump true', join, join)
+        self._block(join)
+
+    def _loop(self, depth):
+        head, body, exit = _Label(), _Label(), _Label()
+        counter = f"i{depth}"
+        self._emit('store 0 to', counter)
+        self._emit('jump true', head, head)
+        self._block(head)
+        i = self._load(counter)
+        cond = self._value()
+        trip = self.random.randint(1, self.MAX_TRIP)
+        self._emit(cond, '= cmp lt', i, trip)
+        self._emit('jump', cond, body, exit)
+        self._block(body)
+        self._sequence(depth + 1, 1)
+        i = self._load(counter)
+        inc = self._value()
+        self._emit(inc, '= add', i, 1)
+        self._emit('store', inc, 'to', counter)
+        self._emit('jump true', head, head)
+        self._block(exit)
+
+    def _sequence(self, depth, length, top_level=False):
+        """
+        Emit at least length statements, depth is the nesting of loops.
+        The top-level sequence goes on until the program has
+        the requested number of blocks, nested sequences (bodies
+        of branches and loops) do not
+        """
+        n = 0
+        while n < length or (top_level and
+                             len(self._blocks) < self.target):
+            n += 1
+            # nested statements stop growing the program when it is big
+            # enough
+            grow = len(self._blocks) < self.target
+            r = self.random.random()
+            if r < self.assert_density:
+                self._assert()
+            elif grow and r < self.assert_density + self.branch_density:
+                self._branch(depth)
+            elif grow and depth < self.loop_depth and\
+                 self.random.random() < 0.3:
+                self._loop(depth)
+            else:
+                self._update()
+
+    def generate(self):
+        """ Get the text of a new program """
+        self._blocks = []
+        self._values = 0
+        self._block()
+        for v in range(self.DATA):
+            self._emit('store', self.random.randint(-10, 10), 'to',
+                       f"v{v}")
+        self._sequence(0, 1, top_level=True)
+        vals = [self._load(f"v{v}") for v in range(self.DATA)]
+        self._emit('print', *vals)
+        self._emit('halt')
+
+        variables = [f"v{v}" for v in range(self.DATA)] +\
+                    [f"n{n}" for n in range(self.nondet)] +\
+                    [f"i{d}" for d in range(self.loop_depth)]
+        lines = [f"variables: {' '.join(variables)}"]
+        for name, body in self._blocks:
+            lines.append("")
+            lines.append(f"block {name}:")
+            lines.extend("  " + " ".join(map(str, parts)) for parts in body)
+        return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    argparser = ArgumentParser()
+    argparser.add_argument('--blocks', type=int, default=10,
+                           help='minimal number of blocks (default: 10)')
+    argparser.add_argument('--loop-depth', type=int, default=1,
+                           help='maximal nesting of loops (default: 1)')
+    argparser.add_argument('--nondet', type=int, default=2,
+                           help='number of input variables (default: 2)')
+    argparser.add_argument('--branch-density', type=float, default=0.2,
+                           help='probability of a branch (default: 0.2)')
+    argparser.add_argument('--assert-density', type=float, default=0.1,
+                           help='probability of an assertion (default: 0.1)')
+    argparser.add_argument('--seed', type=int, default=None,
+                           help='seed of the generator')
+    args = argparser.parse_args()
+
+    print(ProgramGenerator(args.blocks, args.loop_depth, args.nondet,
+                           args.branch_density, args.assert_density,
+                           args.seed).generate(), end='')
@@ -1,13 +1,15 @@
 from language import Instruction, Variable, Cmp
+from liveness import Liveness
 
 class ExecutionState:
-    def __init__(self, pc):
+    def __init__(self, pc, variables_num=0, values_num=0):
         # program counter
         self.pc = pc
-        # values of variables
-        self.variables = {}
-        #states of temporary values (registers)
-        self.values = {}
+        # values of variables, indexed by slots of variables
+        self.variables = [None] * variables_num
+        #states of temporary values (registers), indexed by slots
+        # of instructions
+        self.values = [None] * values_num
         # error encountered during the execution
         self.error = None
 
@@ -22,39 +24,51 @@ class ExecutionState:
 
     def read(self, var):
         assert isinstance(var, Variable)
-        return self.variables.get(var)
+        return self.variables[var.get_slot()]
 
     def write(self, var, value):
         assert isinstance(var, Variable)
         # in symbolic execution, value is expression, not int...
         assert isinstance(value, int)
-        self.variables[var] = value
+        self.variables[var.get_slot()] = value
 
     def eval(self, v):
         if isinstance(v, (int, bool)):
             return v
         assert isinstance(v, Instruction)
-        return self.values.get(v)
+        return self.values[v.get_slot()]
 
     def set(self, lhs, val):
         assert isinstance(lhs, Instruction)
         # in symbolic execution, val is expression, not int...
         assert isinstance(val, int)
-        self.values[lhs] = val
+        self.values[lhs.get_slot()] = val
+
+    def forget(self, values, variables):
+        """ Forget the values and variables with the given slots """
+        for slot in values:
+            self.values[slot] = None
+        for slot in variables:
+            self.variables[slot] = None
 
     def __repr__(self):
-        variables = {x.get_name() : v for (x, v) in self.variables.items()}
-        values = {x.get_name() : v for (x, v) in self.values.items()}
         return f"[\n"\
                f"pc: {self.pc}\n"\
-               f"variables: {variables}\n"\
-               f"values: {values}\n"\
+               f"variables: {self.variables}\n"\
+               f"values: {self.values}\n"\
                 "]"
 
 
 class Interpreter:
-    def __init__(self, program):
+    def __init__(self, program, prune=False):
         self.program = program
+        # liveness for dropping dead values and variables on jumps,
+        # see liveness.py
+        self.liveness = Liveness(program) if prune else None
+
+    def dropDead(self, state, source, target):
+        """ Drop entries of the state that are dead in the target block """
+        state.forget(*self.liveness.dead(source, target))
 
     def executeJump(self, state):
         jump = state.pc
@@ -65,6 +79,8 @@ class Interpreter:
 
         assert condval in [True, False], f"Invalid condition: {condval}"
         successorblock = jump.get_operand(0 if condval else 1)
+        if self.liveness is not None:
+            self.dropDead(state, jump.get_block(), successorblock)
         state.pc = successorblock[0]
         return state
 
@@ -208,8 +224,10 @@ class Interpreter:
         return state
 
     def run(self):
-        entryblock = program.get_entry()
-        state = ExecutionState(entryblock[0])
+        entryblock = self.program.get_entry()
+        state = ExecutionState(entryblock[0],
+                               self.program.get_variables_num(),
+                               self.program.get_values_num())
 
         while state:
             state = self.executeInstruction(state)
@@ -218,16 +236,78 @@ class Interpreter:
 
 
 if __name__ == "__main__":
+    from argparse import ArgumentParser
     from parser import Parser
-    from sys import argv
-    if len(argv) != 2:
-        print(f"Wrong numer of arguments, usage: {argv[0]} <program>")
-        exit(1)
-    parser = Parser(argv[1])
-    program = parser.parse()
+    from ircache import load_program
+    from optimizer import PassManager
+    from decoder import DecodedInterpreter
+    from codegen import CompiledInterpreter
+    from profiler import Profiler, trace
+
+    engines = {
+        'basic': Interpreter,
+        'decoded': DecodedInterpreter,
+        'compiled': CompiledInterpreter,
+    }
+
+    argparser = ArgumentParser()
+    argparser.add_argument('--engine', choices=engines.keys(),
+                           default='decoded',
+                           help='execution engine to use (default: decoded)')
+    argparser.add_argument('--ir-cache', action='store_true',
+                           help='load the parsed program from a cache file '
+                                'next to it (PROGRAM.irc), create the file '
+                                'if it is missing or outdated')
+    argparser.add_argument('-O', '--optimize', action='store_true',
+                           help='optimize the program before running it')
+    argparser.add_argument('--prune', action='store_true',
+                           help='drop dead values and variables on jumps '
+                                '(uses the basic engine)')
+    argparser.add_argument('--trace', action='store_true',
+                           help='print every executed instruction '
+                                '(uses the basic engine)')
+    argparser.add_argument('--profile', metavar='JSON',
+                           help='profile the execution, write the results '
+                                'to the file (uses the basic engine, '
+                                'see profiler.py)')
+    argparser.add_argument('--flamegraph', metavar='FILE',
+                           help='profile the execution, write collapsed '
+                                'stacks for flame graphs to the file '
+                                '(uses the basic engine)')
+    argparser.add_argument('program')
+    args = argparser.parse_args()
+    profile = args.profile or args.flamegraph
+    # only the basic engine executes instructions one by one
+    # in executeInstruction
+    if profile or args.trace or args.prune:
+        args.engine = 'basic'
+
+    if args.ir_cache:
+        program = load_program(args.program)
+    else:
+        parser = Parser(args.program)
+        program = parser.parse()
     if program is None:
         print("Program parsing failed!")
         exit(1)
-
-    I = Interpreter(program)
-    exit(I.run())
+    if args.optimize:
+        PassManager().run(program)
+
+    if args.prune:
+        I = Interpreter(program, prune=True)
+    else:
+        I = engines[args.engine](program)
+    if args.trace:
+        trace(I)
+    if profile:
+        profiler = Profiler()
+        profiler.attach(I)
+    try:
+        result = I.run()
+    finally:
+        # write the profile of failed runs too
+        if args.profile:
+            profiler.write_json(args.profile)
+        if args.flamegraph:
+            profiler.write_collapsed(args.flamegraph)
+    exit(result)
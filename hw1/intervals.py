@@ -0,0 +1,368 @@
+"""
+Interval analysis of programs.
+
+The analysis computes, for every block, an interval of possible values
+of every variable and of every instruction result at the beginning
+of the block, by the usual worklist fixpoint over the CFG. Blocks are
+taken in the reverse postorder and at targets of retreating edges
+(loop headers) the new intervals are widened -- bounds that grow
+go to infinity -- so the fixpoint is reached after a few iterations
+of every loop. Conditions of jumps refine the intervals of the compared
+values (and of the variables that hold them) on both edges,
+conditions of assertions refine them after the assertion (paths that
+violate the assertion end there).
+
+Booleans are the intervals [0, 0] (false), [1, 1] (true) and [0, 1].
+Variables that are read before they are written are inputs (as in the
+symbolic executor), so they can have any value, as do the results
+of divisions by intervals that contain zero.
+
+The results are the sides of jumps and assertions that some execution
+can take: a jump only one side of which is feasible (its condition
+is always true or false, or the values it compares exclude the other
+side) and an assertion that cannot fail do not need the solver
+in the symbolic executor. The analysis is sound for the integer
+semantics only, values of bit-vectors wrap around.
+"""
+
+from heapq import heappush, heappop
+
+from cfg import ControlFlowGraph
+from expressions import smt_div
+from language import Instruction, Cmp
+
+INF = float('inf')
+
+TRUE = (1, 1)
+FALSE = (0, 0)
+BOOL = (0, 1)
+TOP = (-INF, INF)
+
+# the predicate of the negated comparison
+_NEGATED = {
+    Cmp.LT: Cmp.GE, Cmp.LE: Cmp.GT, Cmp.GT: Cmp.LE,
+    Cmp.GE: Cmp.LT, Cmp.EQ: Cmp.NE, Cmp.NE: Cmp.EQ,
+}
+
+
+def _is_inf(x):
+    return x == INF or x == -INF
+
+
+def _add(x, y):
+    # ints do not mix with floats, large ints cannot be converted
+    if _is_inf(x):
+        return x
+    if _is_inf(y):
+        return y
+    return x + y
+
+
+def _mul(x, y):
+    if x == 0 or y == 0:
+        return 0
+    if _is_inf(x) or _is_inf(y):
+        return INF if (x > 0) == (y > 0) else -INF
+    return x * y
+
+
+def _neg(x):
+    return -x
+
+
+def _arith(ty, a, b):
+    """ Get the interval of the result of the arithmetic operation """
+    (al, ah), (bl, bh) = a, b
+    if ty == Instruction.ADD:
+        return _add(al, bl), _add(ah, bh)
+    if ty == Instruction.SUB:
+        return _add(al, _neg(bh)), _add(ah, _neg(bl))
+    if ty == Instruction.MUL:
+        corners = [_mul(x, y) for x in (al, ah) for y in (bl, bh)]
+        return min(corners), max(corners)
+    if ty == Instruction.DIV:
+        # division is monotone in both operands when the sign
+        # of the divisor is fixed
+        if bl <= 0 <= bh or any(map(_is_inf, (al, ah, bl, bh))):
+            return TOP
+        corners = [smt_div(x, y) for x in (al, ah) for y in (bl, bh)]
+        return min(corners), max(corners)
+    raise RuntimeError(f"Invalid arithmetic instruction: {ty}")
+
+
+def _compare(predicate, a, b):
+    """ Get TRUE, FALSE or BOOL for the comparison of the intervals """
+    (al, ah), (bl, bh) = a, b
+    if predicate == Cmp.LT:
+        holds, fails = ah < bl, al >= bh
+    elif predicate == Cmp.LE:
+        holds, fails = ah <= bl, al > bh
+    elif predicate == Cmp.GT:
+        holds, fails = al > bh, ah <= bl
+    elif predicate == Cmp.GE:
+        holds, fails = al >= bh, ah < bl
+    elif predicate in (Cmp.EQ, Cmp.NE):
+        holds = al == ah == bl == bh
+        fails = ah < bl or bh < al
+        if predicate == Cmp.NE:
+            holds, fails = fails, holds
+    else:
+        raise RuntimeError(f"Invalid comparison: {predicate}")
+    return TRUE if holds else FALSE if fails else BOOL
+
+
+def _restrict(predicate, a, b):
+    """
+    Get the intervals of a and b restricted to the values for which
+    the comparison holds, None if there are no such values
+    """
+    (al, ah), (bl, bh) = a, b
+    if predicate == Cmp.LT:
+        ah, bl = min(ah, _add(bh, -1)), max(bl, _add(al, 1))
+    elif predicate == Cmp.LE:
+        ah, bl = min(ah, bh), max(bl, al)
+    elif predicate == Cmp.GT:
+        al, bh = max(al, _add(bl, 1)), min(bh, _add(ah, -1))
+    elif predicate == Cmp.GE:
+        al, bh = max(al, bl), min(bh, ah)
+    elif predicate == Cmp.EQ:
+        al = bl = max(al, bl)
+        ah = bh = min(ah, bh)
+    elif predicate == Cmp.NE:
+        # only a constant at a bound of the other interval cuts it
+        if bl == bh:
+            al, ah = al + (al == bl), ah - (ah == bl)
+        if al == ah:
+            bl, bh = bl + (bl == al), bh - (bh == al)
+    if al > ah or bl > bh:
+        return None
+    return (al, ah), (bl, bh)
+
+
+class _State:
+    """ Intervals of values and variables (by slots), missing ones are TOP """
+
+    __slots__ = ('values', 'variables')
+
+    def __init__(self, values=None, variables=None):
+        self.values = values or {}
+        self.variables = variables or {}
+
+    def copy(self):
+        return _State(dict(self.values), dict(self.variables))
+
+    def __eq__(self, other):
+        return self.values == other.values and\
+               self.variables == other.variables
+
+    @staticmethod
+    def _join(a, b, widen):
+        result = {}
+        for slot, (ol, oh) in a.items():
+            new = b.get(slot)
+            if new is None:
+                continue
+            nl, nh = new
+            if widen:
+                lo = ol if nl >= ol else -INF
+                hi = oh if nh <= oh else INF
+            else:
+                lo, hi = min(ol, nl), max(oh, nh)
+            if (lo, hi) != TOP:
+                result[slot] = (lo, hi)
+        return result
+
+    def join(self, other, widen=False):
+        """ Get the join (or widening) of this (older) state and other """
+        return _State(_State._join(self.values, other.values, widen),
+                      _State._join(self.variables, other.variables, widen))
+
+
+class IntervalAnalysis:
+    def __init__(self, program, cfg=None):
+        self.cfg = cfg or ControlFlowGraph(program)
+        # block -> state at its beginning, missing for unreachable blocks
+        self.states = {}
+        # jump or assertion -> set of feasible values of its condition
+        self.sides = {}
+        self._fixpoint()
+        # the sides are recorded in the final states only
+        for blk, state in self.states.items():
+            self._transfer(blk, state.copy(), record=True)
+
+    def _fixpoint(self):
+        order = self.cfg.rpo_index
+        entry = self.cfg.entry
+        self.states[entry] = _State()
+        worklist = [(order[entry], entry)]
+        queued = {entry}
+        while worklist:
+            _, blk = heappop(worklist)
+            queued.discard(blk)
+            for succ, state in self._transfer(blk, self.states[blk].copy()):
+                old = self.states.get(succ)
+                if old is not None:
+                    # retreating edges close cycles, widen there
+                    state = old.join(state, order[succ] <= order[blk])
+                    if state == old:
+                        continue
+                self.states[succ] = state
+                if succ not in queued:
+                    queued.add(succ)
+                    heappush(worklist, (order[succ], succ))
+
+    def _eval(self, state, op):
+        if isinstance(op, bool):
+            return TRUE if op else FALSE
+        if isinstance(op, int):
+            return op, op
+        return state.values.get(op.get_slot(), TOP)
+
+    def _set(self, state, instruction, interval):
+        if interval == TOP:
+            state.values.pop(instruction.get_slot(), None)
+        else:
+            state.values[instruction.get_slot()] = interval
+
+    def _assume(self, state, cond, value, holders, position):
+        """
+        Restrict the state to the executions in which cond (an operand
+        of the instruction at the position in the block) is value (True
+        or False), return None if there are none
+        """
+        if not isinstance(cond, Instruction):
+            return state if bool(cond) == value else None
+        interval = self._eval(state, cond)
+        if not (interval[0] <= int(value) <= interval[1]):
+            return None
+        state = state.copy()
+        self._set(state, cond, TRUE if value else FALSE)
+        # the compared values are known only if the comparison is
+        # in this block and the values were not recomputed since
+        if cond.get_ty() != Instruction.CMP or\
+           cond.get_block() is not position[0] or\
+           cond.get_block_idx() > position[1]:
+            return state
+        ops = cond.get_operands()
+        for op in ops:
+            if isinstance(op, Instruction) and\
+               op.get_block() is position[0] and\
+               cond.get_block_idx() < op.get_block_idx() < position[1]:
+                return state
+        predicate = cond.get_predicate()
+        if not value:
+            predicate = _NEGATED[predicate]
+        restricted = _restrict(predicate, self._eval(state, ops[0]),
+                               self._eval(state, ops[1]))
+        if restricted is None:
+            return None
+        for op, interval in zip(ops, restricted):
+            if not isinstance(op, Instruction):
+                continue
+            self._set(state, op, interval)
+            for slot, holder in holders.items():
+                if holder is op and interval != TOP:
+                    state.variables[slot] = interval
+        return state
+
+    def _record(self, instruction, side):
+        self.sides.setdefault(instruction, set()).add(side)
+
+    def _transfer(self, blk, state, record=False):
+        """
+        Execute the block on the state (modifies it), return the list
+        of pairs (successor, state at its beginning)
+        """
+        # slot of variable -> instruction of this block whose value
+        # the variable holds (it was loaded or stored by the block)
+        holders = {}
+        for instruction in blk:
+            ty = instruction.get_ty()
+            position = (blk, instruction.get_block_idx())
+            if ty == Instruction.LOAD:
+                slot = instruction.get_operand(0).get_slot()
+                self._set(state, instruction,
+                          state.variables.get(slot, TOP))
+                holders[slot] = instruction
+            elif ty == Instruction.STORE:
+                slot = instruction.get_operand(1).get_slot()
+                interval = self._eval(state, instruction.get_operand(0))
+                if interval == TOP:
+                    state.variables.pop(slot, None)
+                else:
+                    state.variables[slot] = interval
+                op = instruction.get_operand(0)
+                # the operand is recomputed after the store if it
+                # follows the store in the block
+                if isinstance(op, Instruction) and\
+                   op.get_block() is blk and\
+                   op.get_block_idx() < instruction.get_block_idx():
+                    holders[slot] = op
+                else:
+                    holders.pop(slot, None)
+            elif ty in (Instruction.ADD, Instruction.SUB,
+                        Instruction.MUL, Instruction.DIV):
+                a, b = (self._eval(state, op)
+                        for op in instruction.get_operands())
+                self._set(state, instruction, _arith(ty, a, b))
+            elif ty == Instruction.CMP:
+                a, b = (self._eval(state, op)
+                        for op in instruction.get_operands())
+                self._set(state, instruction,
+                          _compare(instruction.get_predicate(), a, b))
+            elif ty == Instruction.ASSERT:
+                cond = instruction.get_condition()
+                if record:
+                    self.sides.setdefault(instruction, set())
+                    if self._assume(state, cond, False, holders,
+                                    position) is not None:
+                        self._record(instruction, False)
+                state = self._assume(state, cond, True, holders, position)
+                if state is None:
+                    return []
+                if record:
+                    self._record(instruction, True)
+            elif ty == Instruction.JUMP:
+                cond = instruction.get_condition()
+                if record:
+                    self.sides.setdefault(instruction, set())
+                successors = []
+                for target, value in zip(instruction.get_operands(),
+                                         (True, False)):
+                    s = self._assume(state, cond, value, holders,
+                                     position)
+                    if s is not None:
+                        successors.append((target, s))
+                        if record:
+                            self._record(instruction, value)
+                return successors
+            elif ty == Instruction.HALT:
+                return []
+        return []
+
+    def proven(self, instruction):
+        """
+        Get True (False) if the condition of the jump or assertion
+        is true (false) in all executions that reach it, None otherwise
+        """
+        sides = self.sides.get(instruction)
+        if sides is None or len(sides) != 1:
+            return None
+        return next(iter(sides))
+
+
+# debugging...
+if __name__ == "__main__":
+    from sys import argv
+    from parser import Parser
+
+    program = Parser(argv[1]).parse()
+    analysis = IntervalAnalysis(program)
+    for blk in analysis.cfg.rpo:
+        state = analysis.states.get(blk)
+        print(f"block {blk.get_name()}:",
+              "unreachable" if state is None else
+              {v.get_name(): state.variables.get(v.get_slot(), TOP)
+               for v in program.get_variables()})
+    for instruction, sides in analysis.sides.items():
+        print(instruction, sorted(sides))
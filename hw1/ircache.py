@@ -0,0 +1,282 @@
+"""
+Binary cache of parsed programs.
+
+The parsed program is stored in a file next to the source (the path
+of the source with the suffix .irc). The cache file starts with
+a header with the SHA-256 hash of the source, so a cache of a modified
+source is never used. The rest of the file are tables:
+
+    strings       names of variables, blocks and instructions
+                  separated by newlines (names cannot contain spaces)
+    variables     index of the name of every variable
+    blocks        index of the name and the number of instructions
+    instructions  opcode, predicate (for cmp), number of operands,
+                  index of the name (-1 for no name), index of the first
+                  operand in the table of operands
+    operands      kind and value, the value is the integer itself
+                  or the index of the variable, block or instruction
+
+Instructions are stored in the order of blocks, which is the order
+in which the parser creates them, so the loaded program gets the same
+ids of instructions and slots of values as the parsed one.
+Operands can refer only to instructions that come earlier.
+"""
+
+from gc import disable, enable, isenabled
+from hashlib import sha256
+from mmap import mmap, ACCESS_READ
+from os import getpid, replace, unlink
+from struct import Struct, error as StructError
+
+from language import *
+from parser import Parser
+
+MAGIC = b'IRC\x01'
+
+# magic, hash of the source, sizes of the string blob
+# and of the tables of variables, blocks, instructions and operands
+_HEADER = Struct('<4s32sIIIII')
+_INDEX = Struct('<I')
+_BLOCK = Struct('<II')
+_INSTRUCTION = Struct('<BBHiI')
+_OPERAND = Struct('<Bq')
+
+# kinds of operands
+_INT = 0
+_BOOL = 1
+_VARIABLE = 2
+_BLOCKREF = 3
+_VALUE = 4
+
+_CLASSES = {
+    Instruction.ADD: Add,
+    Instruction.SUB: Sub,
+    Instruction.MUL: Mul,
+    Instruction.DIV: Div,
+    Instruction.CMP: Cmp,
+    Instruction.JUMP: Jump,
+    Instruction.LOAD: Load,
+    Instruction.STORE: Store,
+    Instruction.PRINT: Print,
+    Instruction.ASSERT: Assert,
+    Instruction.HALT: Halt,
+}
+
+
+def cache_path(path):
+    """ Get the path of the cache file of the program at path """
+    return path + '.irc'
+
+
+def source_hash(path):
+    """ Get the SHA-256 hash of the file at path """
+    h = sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.digest()
+
+
+def _operand(op, variables, blocks, instructions):
+    # bool must go before int, True and False are ints too
+    if isinstance(op, bool):
+        return _BOOL, int(op)
+    if isinstance(op, int):
+        return _INT, op
+    if isinstance(op, Variable):
+        return _VARIABLE, variables[op]
+    if isinstance(op, Block):
+        return _BLOCKREF, blocks[op]
+    return _VALUE, instructions[op]
+
+
+def dump(program, digest):
+    """ Get the binary form of the program, digest is the hash of its source """
+    strings = []
+
+    def string(name):
+        strings.append(name)
+        return len(strings) - 1
+
+    variables = {}
+    vartable = []
+    for var in program.get_variables():
+        variables[var] = len(vartable)
+        vartable.append(_INDEX.pack(string(var.get_name())))
+
+    blocks = {blk: idx for idx, blk in enumerate(program)}
+    blocktable = []
+    instructions = {}
+    insttable = []
+    optable = []
+    for blk in program:
+        blocktable.append(_BLOCK.pack(string(blk.get_name()), blk.size()))
+        for inst in blk:
+            ty = inst.get_ty()
+            operands = inst.get_operands()
+            if ty == Instruction.JUMP:
+                operands = [inst.get_condition()] + operands
+            # only instructions with values have names
+            name = inst.get_name() if inst.get_slot() is not None else None
+            insttable.append(_INSTRUCTION.pack(
+                ty, inst.get_predicate() if ty == Instruction.CMP else 0,
+                len(operands), -1 if name is None else string(name),
+                len(optable)))
+            for op in operands:
+                optable.append(_OPERAND.pack(
+                    *_operand(op, variables, blocks, instructions)))
+            instructions[inst] = len(instructions)
+
+    blob = "\n".join(strings).encode()
+    header = _HEADER.pack(MAGIC, digest, len(blob), len(vartable),
+                          len(blocktable), len(insttable), len(optable))
+    return b"".join([header, blob] + vartable + blocktable +
+                    insttable + optable)
+
+
+def load(data, digest):
+    """
+    Create the program from its binary form, return None if the data
+    are not a cache of the source with the hash digest
+    """
+    if len(data) < _HEADER.size:
+        return None
+    magic, dg, blobsize, nvars, nblocks, ninsts, nops =\
+        _HEADER.unpack_from(data)
+    if magic != MAGIC or dg != digest:
+        return None
+    # a truncated (or otherwise damaged) file has the right hash,
+    # but not the size given by the header
+    if len(data) != _HEADER.size + blobsize + _INDEX.size * nvars +\
+       _BLOCK.size * nblocks + _INSTRUCTION.size * ninsts +\
+       _OPERAND.size * nops:
+        return None
+    offset = _HEADER.size
+    strings = bytes(data[offset:offset + blobsize]).decode().split("\n")
+    offset += blobsize
+
+    def table(struct, num):
+        nonlocal offset
+        end = offset + struct.size * num
+        rows = list(struct.iter_unpack(data[offset:end]))
+        offset = end
+        return rows
+
+    vartable = table(_INDEX, nvars)
+    blocktable = table(_BLOCK, nblocks)
+    insttable = table(_INSTRUCTION, ninsts)
+    optable = table(_OPERAND, nops)
+
+    program = Program()
+    variables = []
+    for (name,) in vartable:
+        var = Variable(strings[name])
+        program.add_variable(var)
+        variables.append(var)
+    blocks = [Block(strings[name]) for name, _ in blocktable]
+    for blk in blocks:
+        program.add_block(blk)
+
+    # tables of objects that operands of the given kind refer to
+    refs = [None, None, variables, blocks, None]
+    instructions = refs[_VALUE] = []
+    new = object.__new__
+    ids = Instruction.id_counter
+    slot = 0
+    rows = iter(insttable)
+    for blk, (_, size) in zip(blocks, blocktable):
+        body = []
+        for idx in range(size):
+            ty, pred, num, name, first = next(rows)
+            Instr = _CLASSES.get(ty)
+            if Instr is None:
+                return None
+            operands = [val if kind == _INT else
+                        bool(val) if kind == _BOOL else refs[kind][val]
+                        for kind, val in optable[first:first + num]]
+
+            # the program was checked when it was parsed, so we can
+            # create the instructions without calling the constructors
+            ids += 1
+            I = new(Instr)
+            I._ty = ty
+            I._id = ids
+            I._block = blk
+            I._block_idx = idx
+            if ty == Instruction.JUMP:
+                I._cond = operands[0]
+                operands = operands[1:]
+            elif ty == Instruction.CMP:
+                I._predicate = pred
+            I._operands = operands
+            if name < 0:
+                I._name = None
+                I._slot = None
+            else:
+                I._name = strings[name]
+                I._slot = slot
+                slot += 1
+            body.append(I)
+            instructions.append(I)
+        blk._instructions = body
+
+    Instruction.id_counter = ids
+    program._values_num = slot
+    return program
+
+
+def load_program(path):
+    """
+    Get the program from the file at path: load it from the cache file
+    if it is up-to-date, otherwise parse it and write the cache file.
+    Returns None if the program cannot be parsed.
+    """
+    digest = source_hash(path)
+    cpath = cache_path(path)
+    # loading creates lots of objects and no garbage, do not let
+    # the garbage collector traverse them over and over again
+    gc_enabled = isenabled()
+    disable()
+    try:
+        with open(cpath, 'rb') as f, mmap(f.fileno(), 0,
+                                          access=ACCESS_READ) as m:
+            with memoryview(m) as data:
+                program = load(data, digest)
+    except (OSError, ValueError, StructError, IndexError, StopIteration):
+        # missing, empty or broken cache file
+        program = None
+    finally:
+        if gc_enabled:
+            enable()
+    if program is not None:
+        return program
+
+    program = Parser(path).parse()
+    if program is None:
+        return None
+    try:
+        data = dump(program, digest)
+        # write a temporary file and rename it, so an interrupted write
+        # never leaves a partial cache file
+        tmp = f"{cpath}.{getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        try:
+            replace(tmp, cpath)
+        except OSError:
+            unlink(tmp)
+            raise
+    except (OSError, StructError):
+        # integers that do not fit in 64 bits or a read-only directory,
+        # just do not cache the program
+        pass
+    return program
+
+
+# debugging...
+if __name__ == "__main__":
+    from sys import argv
+    if len(argv) != 2:
+        print(f"Wrong numer of arguments, usage: {argv[0]} <program>")
+        exit(1)
+    print(load_program(argv[1]))
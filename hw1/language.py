@@ -6,14 +6,26 @@ blocks and the program itself.
 
 class Variable:
     """ Class representing a variable and its value """
+
+    __slots__ = ('_name', '_value', '_slot')
+
     def __init__(self, name):
         self._name = name
         self._value = None
+        # index of the variable in the variables of execution states
+        self._slot = None
 
     def get_name(self):
         """ Get name of the variable """
         return self._name
 
+    def get_slot(self):
+        """ Get the index of the variable in execution states """
+        return self._slot
+
+    def set_slot(self, slot):
+        self._slot = slot
+
     def get_value(self):
         """ Get value of the variable """
 
@@ -26,6 +38,9 @@ class Instruction:
     Base class for instructions
     """
 
+    __slots__ = ('_ty', '_operands', '_id', '_block', '_block_idx',
+                 '_name', '_slot')
+
     id_counter = 0
 
     ADD = 1
@@ -56,6 +71,10 @@ class Instruction:
         assert name is None or isinstance(name, str)
         self._name = name
 
+        # index of the value of the instruction in execution states,
+        # set only for instructions that produce a value
+        self._slot = None
+
     def get_ty(self):
         """ Get the type of instruction """
         return self._ty
@@ -76,10 +95,30 @@ class Instruction:
         """ Get all the operands """
         return self._operands
 
+    def set_operand(self, idx, op):
+        """ Replace the operand with the given index """
+        assert idx < len(self._operands)
+        self._operands[idx] = op
+
     def get_name(self):
         """ Get the name of this instruction or xID if no name is set """
         return self._name or f"x{self.get_id()}"
 
+    def get_slot(self):
+        """ Get the index of the value of this instruction in states """
+        return self._slot
+
+    def set_slot(self, slot):
+        self._slot = slot
+
+    def get_block(self):
+        """ Get the block that contains this instruction """
+        return self._block
+
+    def get_block_idx(self):
+        """ Get the position of this instruction in its block """
+        return self._block_idx
+
     def set_block(self, block, idx):
         assert 0 <= idx < block.size()
         self._block = block
@@ -96,6 +135,9 @@ class Instruction:
 
 class Block:
     """ Block of instructions """
+
+    __slots__ = ('_name', '_instructions')
+
     def __init__(self, name):
         self._name = name
         self._instructions = []
@@ -114,6 +156,12 @@ class Block:
         self._instructions.append(instr)
         instr.set_block(self, len(self._instructions) - 1)
 
+    def set_instructions(self, instrs):
+        """ Replace the instructions of this block """
+        self._instructions = []
+        for instr in instrs:
+            self.add(instr)
+
     def __iter__(self):
         return self._instructions.__iter__()
 
@@ -131,6 +179,9 @@ class Program:
     def __init__(self):
         self._variables = {}
         self._blocks = []
+        # the same blocks as a set, for checking duplicates
+        self._blocks_set = set()
+        self._values_num = 0
 
     def get_entry(self):
         """ Get entry block of the program """
@@ -141,16 +192,47 @@ class Program:
         """ Add block to the program """
 
         assert isinstance(blk, Block)
-        assert blk not in self._blocks, "Duplicate block"
+        assert blk not in self._blocks_set, "Duplicate block"
         self._blocks.append(blk)
+        self._blocks_set.add(blk)
+
+    def remove_blocks(self, blks):
+        """ Remove blocks from the program """
+
+        blks = set(blks)
+        assert blks <= self._blocks_set, "Unknown block"
+        assert self._blocks[0] not in blks, "Removing the entry block"
+        self._blocks = [blk for blk in self._blocks if blk not in blks]
+        self._blocks_set -= blks
 
     def add_variable(self, var):
         """ Add variable to the program """
 
         assert isinstance(var, Variable)
         assert var not in self._variables, "Duplicate variable"
+        var.set_slot(len(self._variables))
         self._variables[var.get_name()] = var
 
+    def add_value(self, instr):
+        """ Assign a slot to an instruction that produces a value """
+
+        assert isinstance(instr, Instruction)
+        assert instr.get_slot() is None, "Duplicate value"
+        instr.set_slot(self._values_num)
+        self._values_num += 1
+
+    def get_variables_num(self):
+        """ Get the number of variable slots in execution states """
+        return len(self._variables)
+
+    def get_values_num(self):
+        """ Get the number of value slots in execution states """
+        return self._values_num
+
+    def get_variables(self):
+        """ Get the list of variables of the program """
+        return list(self._variables.values())
+
     def __iter__(self):
         return self._blocks.__iter__()
 
@@ -177,6 +259,8 @@ def op2str(op):
 class Load(Instruction):
     """ Represents reading a variable """
 
+    __slots__ = ()
+
     def __init__(self, var, name=None):
         super().__init__(Instruction.LOAD, [var], name)
         assert isinstance(var, Variable)
@@ -188,6 +272,8 @@ class Load(Instruction):
 class Store(Instruction):
     """ Represents write to a variable """
 
+    __slots__ = ()
+
     def __init__(self, val, var):
         super().__init__(Instruction.STORE, [val, var])
 
@@ -198,6 +284,8 @@ class Store(Instruction):
 class Print(Instruction):
     """ Represents printing a value """
 
+    __slots__ = ()
+
     def __init__(self, vals):
         super().__init__(Instruction.PRINT, vals)
 
@@ -207,6 +295,8 @@ class Print(Instruction):
 class Halt(Instruction):
     """ Represents halting the program """
 
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(Instruction.HALT, [])
 
@@ -216,6 +306,8 @@ class Halt(Instruction):
 class Assert(Instruction):
     """ Represents assertion """
 
+    __slots__ = ()
+
     def __init__(self, op):
         super().__init__(Instruction.ASSERT, [op])
 
@@ -231,6 +323,9 @@ class Jump(Instruction):
     Represents a jump to t1 if condition is satisfied
     or to t2 if it is not satisfied.
     """
+
+    __slots__ = ('_cond',)
+
     def __init__(self, condition, t1, t2):
         super().__init__(Instruction.JUMP, [t1, t2])
         assert isinstance(t1, Block) and\
@@ -243,6 +338,11 @@ class Jump(Instruction):
         """ Return the condition of this jump """
         return self._cond
 
+    def set_condition(self, condition):
+        """ Replace the condition of this jump """
+        assert condition is not None
+        self._cond = condition
+
     def __repr__(self):
         return "jump {0} {1} {2}".format(op2str(self.get_condition()),
                                          self.get_operand(0).get_name(),
@@ -267,6 +367,9 @@ def predicate_to_str(pred):
 
 class Cmp(Instruction):
     """ The cmp instruction """
+
+    __slots__ = ('_predicate',)
+
     LT = 1
     LE = 2
     GT = 3
@@ -294,6 +397,8 @@ class Cmp(Instruction):
 class Add(Instruction):
     """ The add instruction """
 
+    __slots__ = ()
+
     def __init__(self, a, b, name=None):
         super().__init__(Instruction.ADD, [a, b], name)
 
@@ -305,6 +410,8 @@ class Add(Instruction):
 class Sub(Instruction):
     """ The sub instruction """
 
+    __slots__ = ()
+
     def __init__(self, a, b, name=None):
         super().__init__(Instruction.SUB, [a, b], name)
 
@@ -316,6 +423,8 @@ class Sub(Instruction):
 class Mul(Instruction):
     """ The mul instruction """
 
+    __slots__ = ()
+
     def __init__(self, a, b, name=None):
         super().__init__(Instruction.MUL, [a, b], name)
 
@@ -327,6 +436,8 @@ class Mul(Instruction):
 class Div(Instruction):
     """ The div instruction """
 
+    __slots__ = ()
+
     def __init__(self, a, b, name=None):
         super().__init__(Instruction.DIV, [a, b], name)
 
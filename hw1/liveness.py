@@ -0,0 +1,105 @@
+"""
+Liveness of values and variables.
+
+A value (the result of an instruction) is live at a point of the program
+if some path from the point uses the value before the instruction that
+computes it is executed again. A variable is live if some path loads it
+before it is stored. Dead values and variables are never read again,
+so executors can forget them: states do not grow along paths and dead
+entries are not copied when states fork (and do not keep expressions
+alive in the symbolic executor). Dropping a dead value does not change
+errors either -- an instruction that uses a value that was not computed
+on the path uses it before it is (re)computed, so the value is live.
+
+Liveness is computed per block by the usual backward data-flow analysis
+on the CFG. Executors drop entries on jumps: the entries that can be
+set at the end of the source block are the ones live at its beginning
+and the ones it sets (everything else was dropped when the block was
+entered), those that are not live at the beginning of the target block
+are dropped.
+"""
+
+from cfg import ControlFlowGraph
+from language import Instruction
+
+
+def _body(blk):
+    """ Get the instructions of the block up to the first terminator """
+    for instruction in blk:
+        yield instruction
+        if instruction.get_ty() in (Instruction.JUMP, Instruction.HALT):
+            break
+
+
+def _used_values(instruction):
+    if instruction.get_ty() == Instruction.JUMP:
+        ops = [instruction.get_condition()]
+    else:
+        ops = instruction.get_operands()
+    return [op.get_slot() for op in ops if isinstance(op, Instruction)]
+
+
+class Liveness:
+    def __init__(self, program, cfg=None):
+        self.cfg = cfg or ControlFlowGraph(program)
+        # block -> slots of values and variables used in the block
+        # before they are set in it and slots that the block sets
+        uses, defs = {}, {}
+        for blk in self.cfg.rpo:
+            used_vals, used_vars = set(), set()
+            def_vals, def_vars = set(), set()
+            for instruction in _body(blk):
+                for slot in _used_values(instruction):
+                    if slot not in def_vals:
+                        used_vals.add(slot)
+                ty = instruction.get_ty()
+                if ty == Instruction.LOAD:
+                    slot = instruction.get_operand(0).get_slot()
+                    if slot not in def_vars:
+                        used_vars.add(slot)
+                elif ty == Instruction.STORE:
+                    def_vars.add(instruction.get_operand(1).get_slot())
+                if instruction.get_slot() is not None:
+                    def_vals.add(instruction.get_slot())
+            uses[blk] = (used_vals, used_vars)
+            defs[blk] = (def_vals, def_vars)
+        self._defs = defs
+
+        # block -> slots of values and variables live at its beginning
+        self.live_in = {blk: (set(vals), set(vars))
+                        for blk, (vals, vars) in uses.items()}
+        changed = True
+        while changed:
+            changed = False
+            for blk in reversed(self.cfg.rpo):
+                out_vals, out_vars = set(), set()
+                for succ in self.cfg.successors[blk]:
+                    out_vals |= self.live_in[succ][0]
+                    out_vars |= self.live_in[succ][1]
+                live_vals, live_vars = self.live_in[blk]
+                new_vals = out_vals - defs[blk][0]
+                new_vars = out_vars - defs[blk][1]
+                if not (new_vals <= live_vals and new_vars <= live_vars):
+                    live_vals |= new_vals
+                    live_vars |= new_vars
+                    changed = True
+
+        # (source, target) -> dead slots of values and variables
+        self._dead = {}
+
+    def dead(self, source, target):
+        """
+        Get the pair of tuples of slots of values and variables that
+        can be set after the block source and are dead at the beginning
+        of the block target
+        """
+        key = (source, target)
+        dead = self._dead.get(key)
+        if dead is None:
+            live_vals, live_vars = self.live_in[source]
+            def_vals, def_vars = self._defs[source]
+            target_vals, target_vars = self.live_in[target]
+            dead = (tuple(sorted((live_vals | def_vals) - target_vals)),
+                    tuple(sorted((live_vars | def_vars) - target_vars)))
+            self._dead[key] = dead
+        return dead
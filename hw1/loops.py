@@ -0,0 +1,254 @@
+"""
+Loop acceleration for the symbolic executor.
+
+A loop that only counts (adds loop invariant values to its variables
+until a comparison fails) is unrolled by the executor one iteration
+at a time, forking on every check of the loop condition. Instead,
+the accelerator summarizes the whole loop: the number of iterations
+is a fresh symbol N and the values of the variables after the loop
+are closed-form expressions over N.
+
+Loops are recognized on the blocks of the program: the loop must be
+a natural loop that consists of a single block ending with a jump on
+a comparison back to itself or out of the loop. Values computed in
+the block are affine forms over the values of the variables at the
+beginning of the iteration (and values computed outside of the loop).
+A variable that the loop increments by an invariant value is a basic
+induction variable, v(k) = v(0) + k*s. A variable that the loop
+increments by a sum of basic induction variables is a derived one,
+its value after k iterations has a quadratic term in k. The loop
+condition may use basic induction variables only, then the set of
+iterations on which the loop goes on is an interval and the exit
+after the iteration N is described by
+
+    N >= 0 and not stay(N) and (N == 0 or (stay(0) and stay(N - 1)))
+
+Loops with other instructions (print, assert, division, ...),
+with several blocks or with other conditions are unrolled as before.
+"""
+
+from z3 import And, Or, Not, Int, IntVal, simplify
+
+from language import Instruction, Cmp
+
+# predicates whose sets of satisfying iterations are intervals
+_MONOTONE = (Cmp.LT, Cmp.LE, Cmp.GT, Cmp.GE)
+
+# key of the constant term in affine forms
+_CONST = None
+
+
+def _add(a, b, coef=1):
+    """ Get the affine form a + coef*b """
+    res = dict(a)
+    for atom, c in b.items():
+        res[atom] = res.get(atom, 0) + coef * c
+        if res[atom] == 0 and atom is not _CONST:
+            del res[atom]
+    return res
+
+
+def _scale(a, coef):
+    return {atom: coef * c for atom, c in a.items()}
+
+
+def _compare(predicate, a, b):
+    if predicate == Cmp.LT:
+        return a < b
+    if predicate == Cmp.LE:
+        return a <= b
+    if predicate == Cmp.GT:
+        return a > b
+    return a >= b
+
+
+class LoopSummary:
+    """
+    Closed form of a single-block loop. Affine forms are dictionaries
+    mapping atoms to integer coefficients, an atom is a variable
+    (its value at the beginning of the iteration), an instruction
+    computed outside of the loop or _CONST for the constant term.
+    """
+
+    def __init__(self, block, exit, stay_on_true, cmp, forms, stored):
+        self.block = block
+        self.exit = exit
+        # does the loop go on if the comparison is true?
+        self.stay_on_true = stay_on_true
+        # the comparison that decides the jump
+        self.cmp = cmp
+        # instruction -> affine form (the pair of forms for the comparison)
+        self.forms = forms
+        # variable -> increment of the variable in one iteration
+        self.increments = {var: _add(form, {var: 1}, -1)
+                           for var, form in stored.items()}
+
+    def _variable(self, state, var, k, initial):
+        if isinstance(k, int):
+            k = IntVal(k)
+        init = initial(var)
+        inc = self.increments.get(var)
+        if inc is None:
+            return init
+        # the increment in the iteration j is d0 + j*step
+        d0 = self._evaluate(state, inc, 0, initial)
+        step = simplify(self._evaluate(state, inc, 1, initial) - d0)
+        value = init + k * d0
+        if not (step.eq(IntVal(0))):
+            value = value + step * (k * (k - 1) / 2)
+        return value
+
+    def _evaluate(self, state, form, k, initial):
+        """ Evaluate the form in the iteration k """
+        value = IntVal(form.get(_CONST, 0))
+        for atom, coef in form.items():
+            if atom is _CONST:
+                continue
+            if isinstance(atom, Instruction):
+                atom = state.values[atom.get_slot()]
+            else:
+                atom = self._variable(state, atom, k, initial)
+            value = value + coef * atom
+        return value
+
+    def _stay(self, state, k, initial):
+        a, b = self.forms[self.cmp]
+        cond = _compare(self.cmp.get_predicate(),
+                        self._evaluate(state, a, k, initial),
+                        self._evaluate(state, b, k, initial))
+        return cond if self.stay_on_true else Not(cond)
+
+    def apply(self, state, trip):
+        """
+        Summarize the loop for the state at the beginning of the loop,
+        trip is the symbol for the index of the last iteration.
+        Returns the constraint on the trip count and the lists of pairs
+        (variable, value) and (instruction, value) after the loop,
+        or None if the loop uses unknown values.
+        """
+        for form in self._atoms():
+            if isinstance(form, Instruction) and\
+               state.values[form.get_slot()] is None:
+                return None
+
+        def initial(var):
+            value = state.read(var)
+            return Int(var.get_name()) if value is None else value
+
+        constraint = And(trip >= 0, Not(self._stay(state, trip, initial)),
+                         Or(trip == 0, And(self._stay(state, 0, initial),
+                                           self._stay(state, trip - 1,
+                                                      initial))))
+        variables = [(var, simplify(self._variable(state, var, trip + 1,
+                                                   initial)))
+                     for var in self.increments]
+        values = []
+        for inst, form in self.forms.items():
+            if inst is self.cmp:
+                a, b = form
+                value = _compare(inst.get_predicate(),
+                                 self._evaluate(state, a, trip, initial),
+                                 self._evaluate(state, b, trip, initial))
+            else:
+                value = self._evaluate(state, form, trip, initial)
+            values.append((inst, simplify(value)))
+        return simplify(constraint), variables, values
+
+    def _atoms(self):
+        for form in self.forms.values():
+            if isinstance(form, tuple):
+                yield from form[0]
+                yield from form[1]
+            else:
+                yield from form
+
+
+class LoopAccelerator:
+    def __init__(self, cfg):
+        # header of the loop -> summary
+        self.summaries = {}
+        for loop in cfg.loops:
+            if len(loop.blocks) == 1:
+                summary = self._analyze(loop.header)
+                if summary is not None:
+                    self.summaries[loop.header] = summary
+
+    def get(self, block):
+        """ Get the summary of the loop with the header block or None """
+        return self.summaries.get(block)
+
+    def _analyze(self, block):
+        forms = {}
+        stored = {}
+
+        def form(op):
+            if isinstance(op, bool):
+                return None
+            if isinstance(op, int):
+                return {_CONST: op}
+            if op in forms:
+                f = forms[op]
+                return None if isinstance(f, tuple) else f
+            if op.get_block() is block:
+                # used before it is computed in the iteration
+                return None
+            return {op: 1}
+
+        for instruction in block:
+            ty = instruction.get_ty()
+            if ty == Instruction.JUMP:
+                break
+            if ty == Instruction.LOAD:
+                var = instruction.get_operand(0)
+                forms[instruction] = stored.get(var, {var: 1})
+            elif ty == Instruction.STORE:
+                f = form(instruction.get_operand(0))
+                if f is None:
+                    return None
+                stored[instruction.get_operand(1)] = f
+            elif ty in (Instruction.ADD, Instruction.SUB, Instruction.MUL):
+                a = form(instruction.get_operand(0))
+                b = form(instruction.get_operand(1))
+                if a is None or b is None:
+                    return None
+                if ty == Instruction.ADD:
+                    forms[instruction] = _add(a, b)
+                elif ty == Instruction.SUB:
+                    forms[instruction] = _add(a, b, -1)
+                elif set(a) <= {_CONST}:
+                    forms[instruction] = _scale(b, a.get(_CONST, 0))
+                elif set(b) <= {_CONST}:
+                    forms[instruction] = _scale(a, b.get(_CONST, 0))
+                else:
+                    return None
+            elif ty == Instruction.CMP:
+                a = form(instruction.get_operand(0))
+                b = form(instruction.get_operand(1))
+                if a is None or b is None:
+                    return None
+                forms[instruction] = (a, b)
+            else:
+                return None
+        else:
+            return None
+
+        jump = instruction
+        cmp = jump.get_condition()
+        t, f = jump.get_operands()
+        if not isinstance(cmp, Instruction) or\
+           not isinstance(forms.get(cmp), tuple) or\
+           cmp.get_predicate() not in _MONOTONE or (t is block) == (f is block):
+            return None
+
+        summary = LoopSummary(block, f if t is block else t, t is block,
+                              cmp, forms, stored)
+        # basic induction variables are incremented by invariant values
+        basic = {var for var, inc in summary.increments.items()
+                 if not any(atom in stored for atom in inc)}
+        for var, inc in summary.increments.items():
+            if any(atom in stored and atom not in basic for atom in inc):
+                return None
+        a, b = forms[cmp]
+        if any(atom in stored and atom not in basic for atom in {**a, **b}):
+            return None
+        return summary
@@ -0,0 +1,159 @@
+"""
+State merging at control flow joins.
+
+States that reach the beginning of a join block (a block with more than
+one predecessor) are parked instead of being scheduled. A parked state
+is merged with a state that arrives at the same block later: values
+that differ become if-then-else expressions over the guards of the two
+states and the path condition becomes the common prefix of the two path
+conditions extended with the disjunction of the guards. The guard of
+a state is the conjunction of the constraints it has on top of the common
+prefix; guards of two different states are disjoint, because the states
+were split by a branch on a condition and its negation.
+
+Parked states are released when there is nothing else to execute,
+the topologically first join block goes first, so that states that
+reach later joins from it can be merged there too. Only joins outside
+of loops are merge points: merging at loop headers would merge
+different iterations and the if-then-else expressions would grow with
+every iteration. Values that are known in one of the states only
+are dropped if no instruction reachable from the join uses them,
+otherwise the states are not merged.
+
+A merged state stands for several paths. It keeps the guards of its
+constituent paths, so the executor can count paths exactly: a branch
+that is feasible on both sides sends every constituent to the sides
+that are feasible for it, and an assertion fails for those constituents
+that can violate it.
+"""
+
+from z3 import And, Or, If
+
+from language import Instruction
+
+
+def _conjunction(constraints):
+    if len(constraints) == 1:
+        return constraints[0]
+    return And(*constraints)
+
+
+class StateMerger:
+    def __init__(self, program, cfg):
+        loops = cfg.loop_blocks()
+        self._points = {blk for blk in cfg.rpo
+                        if len(cfg.predecessors[blk]) > 1 and blk not in loops}
+        self._order = cfg.rpo_index
+        # merge point -> slots of values used in blocks reachable from it
+        self._used = {blk: self._used_values(cfg, blk) for blk in self._points}
+        self._variables = program.get_variables()
+        # block -> states parked at its beginning
+        self._parked = {}
+        # number of merges done
+        self.merged = 0
+
+    def _used_values(self, cfg, blk):
+        used = set()
+        visited = {blk}
+        stack = [blk]
+        while stack:
+            b = stack.pop()
+            for instruction in b:
+                if instruction.get_ty() == Instruction.JUMP:
+                    operands = [instruction.get_condition()]
+                else:
+                    operands = instruction.get_operands()
+                for op in operands:
+                    if isinstance(op, Instruction):
+                        used.add(op.get_slot())
+            for succ in cfg.successors[b]:
+                if succ not in visited:
+                    visited.add(succ)
+                    stack.append(succ)
+        return frozenset(used)
+
+    def park(self, states):
+        """ Park the states that are at merge points, return the others """
+        rest = []
+        for state in states:
+            pc = state.pc
+            if state.error or pc.get_block_idx() != 0 or\
+               pc.get_block() not in self._points:
+                rest.append(state)
+                continue
+
+            parked = self._parked.setdefault(pc.get_block(), [])
+            for idx, other in enumerate(parked):
+                merged = self.merge(other, state)
+                if merged is not None:
+                    parked[idx] = merged
+                    self.merged += 1
+                    break
+            else:
+                parked.append(state)
+        return rest
+
+    def release(self):
+        """ Get the states parked at the topologically first merge point """
+        if not self._parked:
+            return []
+        blk = min(self._parked, key=self._order.__getitem__)
+        return self._parked.pop(blk)
+
+    def __len__(self):
+        return sum(len(states) for states in self._parked.values())
+
+    def merge(self, a, b):
+        """
+        Merge the states a and b that are at the same instruction,
+        return None if they cannot be merged
+        """
+        # values that are unknown in one state only cannot be merged
+        # if they are used later, using them is an error in that state
+        used = self._used[a.pc.get_block()]
+        dropped = []
+        for idx, (x, y) in enumerate(zip(a.values, b.values)):
+            if (x is None) != (y is None):
+                if idx in used:
+                    return None
+                dropped.append(idx)
+
+        # find the common prefix of the path conditions
+        na, nb = a.constraints, b.constraints
+        sa, sb = [], []
+        while len(na) > len(nb):
+            sa.append(na.get_head())
+            na = na.get_tail()
+        while len(nb) > len(na):
+            sb.append(nb.get_head())
+            nb = nb.get_tail()
+        while na is not nb:
+            sa.append(na.get_head())
+            na = na.get_tail()
+            sb.append(nb.get_head())
+            nb = nb.get_tail()
+        if not sa or not sb:
+            return None
+
+        ga, gb = _conjunction(sa), _conjunction(sb)
+        n = a.copy()
+        n.constraints = na.push(Or(ga, gb))
+        for idx, (x, y) in enumerate(zip(a.values, b.values)):
+            if x is not None and y is not None and not x.eq(y):
+                n.values[idx] = If(ga, x, y)
+        for idx in dropped:
+            n.values[idx] = None
+        for var, x, y in zip(self._variables, a.variables, b.variables):
+            if x is None and y is None:
+                continue
+            # variables that were not written yet are read as fresh symbols
+            if x is None:
+                x = a.expressions.symbol(var.get_name())
+            if y is None:
+                y = b.expressions.symbol(var.get_name())
+            if not x.eq(y):
+                n.variables[var.get_slot()] = If(ga, x, y)
+
+        n.paths = [And(ga, g) for g in a.get_paths()] +\
+                  [And(gb, g) for g in b.get_paths()]
+        return n
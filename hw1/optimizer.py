@@ -0,0 +1,378 @@
+"""
+Optimizations of programs before their execution.
+
+The pass manager runs the passes over the program until none of them
+changes anything (or until the limit on the number of rounds is hit).
+The passes keep the observable behaviour of the program: the printed
+values, the errors and the paths (so also the numbers of paths found
+by the symbolic executor). Instructions may use unknown values (values
+computed in blocks that were not executed) and loads may read
+uninitialized variables. So a use of a value is replaced only if the
+value is always computed before the use (its block dominates the block
+of the use) and an instruction is deleted only if it cannot fail.
+"""
+
+from cfg import ControlFlowGraph
+from language import Instruction, Cmp
+
+_FOLDABLE = {
+    Instruction.ADD: lambda a, b: a + b,
+    Instruction.SUB: lambda a, b: a - b,
+    Instruction.MUL: lambda a, b: a * b,
+}
+
+_PREDICATES = {
+    Cmp.LT: lambda a, b: a < b,
+    Cmp.LE: lambda a, b: a <= b,
+    Cmp.GT: lambda a, b: a > b,
+    Cmp.GE: lambda a, b: a >= b,
+    Cmp.EQ: lambda a, b: a == b,
+    Cmp.NE: lambda a, b: a != b,
+}
+
+
+def _is_int(op):
+    return isinstance(op, int) and not isinstance(op, bool)
+
+
+def _is_terminator(instruction):
+    return instruction.get_ty() in (Instruction.JUMP, Instruction.HALT)
+
+
+def _is_unconditional(instruction):
+    return instruction.get_ty() == Instruction.JUMP and\
+           not isinstance(instruction.get_condition(), Instruction)
+
+
+def _uses(instruction):
+    """ Get the operands of the instruction that may be values """
+    if instruction.get_ty() == Instruction.JUMP:
+        return [instruction.get_condition()]
+    if instruction.get_ty() in (Instruction.LOAD, Instruction.STORE):
+        return instruction.get_operands()[:1]
+    return instruction.get_operands()
+
+
+def _available(op, instruction, cfg):
+    """ Is the operand always computed when the instruction is executed? """
+    if not isinstance(op, Instruction):
+        return True
+    blk = instruction.get_block()
+    if op.get_block() is blk:
+        return op.get_block_idx() < instruction.get_block_idx()
+    return cfg.dominates(op.get_block(), blk)
+
+
+def _substitute(program, mapping):
+    """
+    Replace the uses of values from the mapping by their replacements,
+    return the number of replaced operands. Only the uses where the
+    replaced value is always computed are replaced, the other uses are
+    errors (using an unknown value) and must stay errors.
+    """
+    cfg = ControlFlowGraph(program)
+    replaced = 0
+
+    def resolve(op):
+        while op in mapping:
+            op = mapping[op]
+        return op
+
+    for blk in program:
+        for instruction in blk:
+            if instruction.get_ty() == Instruction.JUMP:
+                cond = instruction.get_condition()
+                if isinstance(cond, Instruction) and cond in mapping and\
+                   _available(cond, instruction, cfg):
+                    instruction.set_condition(resolve(cond))
+                    replaced += 1
+                continue
+            for idx, op in enumerate(_uses(instruction)):
+                if isinstance(op, Instruction) and op in mapping and\
+                   _available(op, instruction, cfg):
+                    instruction.set_operand(idx, resolve(op))
+                    replaced += 1
+    return replaced
+
+
+class Pass:
+    """ Base class of optimization passes """
+
+    name = None
+
+    def run(self, program):
+        """ Transform the program, return the number of changes """
+        raise NotImplementedError
+
+
+class ConstantFolding(Pass):
+    """ Replace arithmetic and comparisons of constants by their results """
+
+    name = 'constant-folding'
+
+    def run(self, program):
+        cfg = ControlFlowGraph(program)
+        mapping = {}
+
+        def value(op, instruction):
+            if op in mapping and _available(op, instruction, cfg):
+                return mapping[op]
+            return op
+
+        for blk in program:
+            for instruction in blk:
+                ty = instruction.get_ty()
+                if ty not in _FOLDABLE and ty != Instruction.CMP:
+                    continue
+                a, b = (value(op, instruction)
+                        for op in instruction.get_operands())
+                if not (_is_int(a) and _is_int(b)):
+                    continue
+                if ty == Instruction.CMP:
+                    pred = _PREDICATES[instruction.get_predicate()]
+                    mapping[instruction] = pred(a, b)
+                else:
+                    mapping[instruction] = _FOLDABLE[ty](a, b)
+
+        # the folded instructions are deleted as unused
+        return _substitute(program, mapping)
+
+
+class StoreToLoadForwarding(Pass):
+    """
+    Replace a load by the value that was stored to (or loaded from)
+    the variable earlier in the same block
+    """
+
+    name = 'store-to-load-forwarding'
+
+    def run(self, program):
+        mapping = {}
+        for blk in program:
+            # variable -> its current value
+            known = {}
+            for instruction in blk:
+                ty = instruction.get_ty()
+                if ty == Instruction.STORE:
+                    val, var = instruction.get_operands()
+                    known[var] = mapping.get(val, val)
+                elif ty == Instruction.LOAD:
+                    var = instruction.get_operand(0)
+                    if var in known:
+                        mapping[instruction] = known[var]
+                    else:
+                        known[var] = instruction
+
+        # the loads that are not used anymore are deleted as unused
+        return _substitute(program, mapping)
+
+
+class JumpThreading(Pass):
+    """
+    Make jumps on constant conditions jump directly to the taken
+    successor and jump over blocks that only jump further
+    """
+
+    name = 'jump-threading'
+
+    def _target(self, blk):
+        """ Follow the blocks that consist of an unconditional jump """
+        visited = {blk}
+        while blk.size() == 1 and _is_unconditional(blk[0]):
+            jump = blk[0]
+            nxt = jump.get_operand(0 if jump.get_condition() else 1)
+            if nxt in visited:
+                break
+            visited.add(nxt)
+            blk = nxt
+        return blk
+
+    def run(self, program):
+        changes = 0
+        for blk in program:
+            for instruction in blk:
+                if instruction.get_ty() != Instruction.JUMP:
+                    continue
+                cond = instruction.get_condition()
+                if not isinstance(cond, Instruction):
+                    taken = instruction.get_operand(0 if cond else 1)
+                    target = self._target(taken)
+                    if cond is not True or\
+                       instruction.get_operand(0) is not target or\
+                       instruction.get_operand(1) is not target:
+                        instruction.set_condition(True)
+                        instruction.set_operand(0, target)
+                        instruction.set_operand(1, target)
+                        changes += 1
+                    continue
+                for idx in (0, 1):
+                    target = self._target(instruction.get_operand(idx))
+                    if target is not instruction.get_operand(idx):
+                        instruction.set_operand(idx, target)
+                        changes += 1
+        return changes
+
+
+class BlockMerging(Pass):
+    """
+    Append a block to its only predecessor that jumps to it
+    unconditionally
+    """
+
+    name = 'block-merging'
+
+    def run(self, program):
+        cfg = ControlFlowGraph(program)
+        # merged block -> the block it was appended to
+        merged = {}
+
+        def owner(blk):
+            while blk in merged:
+                blk = merged[blk]
+            return blk
+
+        for blk in cfg.rpo:
+            if blk in merged:
+                continue
+            instructions = list(blk)
+            while instructions and _is_unconditional(instructions[-1]):
+                jump = instructions[-1]
+                succ = jump.get_operand(0 if jump.get_condition() else 1)
+                preds = cfg.predecessors[succ]
+                if succ is cfg.entry or len(preds) != 1 or\
+                   owner(preds[0]) is not blk or owner(succ) is blk:
+                    break
+                instructions.pop()
+                instructions.extend(succ)
+                merged[succ] = blk
+            if len(instructions) != blk.size() or\
+               any(a is not b for a, b in zip(instructions, blk)):
+                blk.set_instructions(instructions)
+
+        program.remove_blocks(merged)
+        return len(merged)
+
+
+class DeadCodeElimination(Pass):
+    """
+    Delete unreachable blocks, instructions after the end of blocks,
+    assertions of true and unused instructions that cannot fail
+    """
+
+    name = 'dead-code-elimination'
+
+    def run(self, program):
+        changes = 0
+        for blk in program:
+            for idx, instruction in enumerate(blk):
+                if _is_terminator(instruction):
+                    if idx + 1 < blk.size():
+                        changes += blk.size() - idx - 1
+                        blk.set_instructions(list(blk)[:idx + 1])
+                    break
+
+        cfg = ControlFlowGraph(program)
+        unreachable = [blk for blk in program if not cfg.is_reachable(blk)]
+        if unreachable:
+            program.remove_blocks(unreachable)
+            changes += len(unreachable)
+
+        uses = {}
+        for blk in program:
+            for instruction in blk:
+                for op in _uses(instruction):
+                    if isinstance(op, Instruction):
+                        uses[op] = uses.get(op, 0) + 1
+
+        def initialized(load):
+            """ Was the loaded variable accessed earlier in the block? """
+            var = load.get_operand(0)
+            blk = load.get_block()
+            for idx in range(load.get_block_idx()):
+                i = blk[idx]
+                if i.get_ty() == Instruction.LOAD and i.get_operand(0) is var:
+                    return True
+                if i.get_ty() == Instruction.STORE and\
+                   i.get_operand(1) is var:
+                    return True
+            return False
+
+        def removable(instruction):
+            ty = instruction.get_ty()
+            if ty == Instruction.ASSERT:
+                return instruction.get_condition() is True
+            if ty == Instruction.LOAD:
+                # the load of an uninitialized variable fails
+                return uses.get(instruction, 0) == 0 and\
+                       initialized(instruction)
+            if ty == Instruction.DIV:
+                divisor = instruction.get_operand(1)
+                if not _is_int(divisor) or divisor == 0:
+                    return False
+            elif ty not in _FOLDABLE and ty != Instruction.CMP:
+                return False
+            if uses.get(instruction, 0) > 0:
+                return False
+            return all(_available(op, instruction, cfg)
+                       for op in instruction.get_operands())
+
+        removed = set()
+        worklist = [i for blk in program for i in blk if removable(i)]
+        while worklist:
+            instruction = worklist.pop()
+            if instruction in removed:
+                continue
+            removed.add(instruction)
+            for op in _uses(instruction):
+                if isinstance(op, Instruction):
+                    uses[op] -= 1
+                    if removable(op):
+                        worklist.append(op)
+
+        if removed:
+            for blk in program:
+                kept = [i for i in blk if i not in removed]
+                if len(kept) != blk.size():
+                    blk.set_instructions(kept)
+        return changes + len(removed)
+
+
+def default_passes():
+    return [DeadCodeElimination(), ConstantFolding(), StoreToLoadForwarding(),
+            JumpThreading(), BlockMerging(), DeadCodeElimination()]
+
+
+class PassManager:
+    def __init__(self, passes=None, max_rounds=10):
+        self.passes = default_passes() if passes is None else passes
+        self.max_rounds = max_rounds
+        # name of the pass -> number of changes it made
+        self.stats = {p.name: 0 for p in self.passes}
+
+    def run(self, program):
+        """ Optimize the program in place, return the program """
+        for _ in range(self.max_rounds):
+            changed = False
+            for p in self.passes:
+                changes = p.run(program)
+                self.stats[p.name] += changes
+                changed = changed or changes > 0
+            if not changed:
+                break
+        return program
+
+
+# debugging...
+if __name__ == "__main__":
+    from sys import argv
+    from parser import Parser
+    if len(argv) != 2:
+        print(f"Wrong numer of arguments, usage: {argv[0]} <program>")
+        exit(1)
+    program = Parser(argv[1]).parse()
+    if program is None:
+        exit(1)
+    manager = PassManager()
+    print(manager.run(program))
+    for name, changes in manager.stats.items():
+        print(f"; {name}: {changes}")
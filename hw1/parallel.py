@@ -0,0 +1,224 @@
+"""
+Parallel symbolic execution.
+
+Pending states are spread over a pool of worker processes, every worker
+has its own z3 context and explores the states it gets with the usual
+depth-first search. When some worker is idle, busy workers give away
+the bottom half of their worklists (the states closest to the root,
+that is, the largest unexplored subtrees). States move between
+processes in a serializable form: the program counter is the name of
+the block and the index in it, expressions are SMT-LIB terms.
+Numbers of paths and errors found by the workers are summed up,
+so the result is the same as of the sequential executor.
+"""
+
+from multiprocessing import get_context
+from traceback import format_exc
+from z3 import parse_smt2_string
+
+from parser import Parser
+from optimizer import PassManager
+from symbolicexecutor import SymbolicExecutionState, SymbolicExecutor
+from persistent import PathCondition
+from assignment import Assignment
+from querycache import ConstraintSlicer
+from budget import peak_memory
+
+# how many instructions a worker executes between looking for idle workers
+DONATE_INTERVAL = 64
+
+_slicer = ConstraintSlicer()
+
+
+def serialize_exprs(exprs):
+    """ Serialize the list of z3 expressions into an SMT-LIB script """
+    lines = []
+    for c in _slicer.consts(_slicer.symbols_of(exprs)):
+        lines.append(f"(declare-fun {c.sexpr()} () {c.sort().sexpr()})")
+    for i, e in enumerate(exprs):
+        lines.append(f"(declare-fun __e{i} () {e.sort().sexpr()})")
+        lines.append(f"(assert (= __e{i} {e.sexpr()}))")
+    return "\n".join(lines)
+
+
+def deserialize_exprs(text):
+    """ Get the list of z3 expressions from serialize_exprs() output """
+    if not text:
+        return []
+    return [a.arg(1) for a in parse_smt2_string(text)]
+
+
+def serialize_state(state):
+    """ Get a picklable form of the symbolic state """
+    constraints = list(state.constraints)
+    constraints.reverse()
+    variables = [(i, v) for i, v in enumerate(state.variables)
+                 if v is not None]
+    values = [(i, v) for i, v in enumerate(state.values) if v is not None]
+    model = state.model.pairs()
+
+    exprs = constraints + [v for _, v in variables] + [v for _, v in values]
+    for symbol, value in model:
+        exprs.append(symbol)
+        exprs.append(value)
+
+    return {
+        'pc': (state.pc.get_block().get_name(), state.pc.get_block_idx()),
+        'constraints': len(constraints),
+        'variables': [i for i, _ in variables],
+        'values': [i for i, _ in values],
+        'model': len(model),
+        'exprs': serialize_exprs(exprs),
+        'error': state.error,
+    }
+
+
+def deserialize_state(data, program, blocks):
+    """
+    Create the symbolic state from serialize_state() output,
+    blocks maps names of blocks of the program to the blocks
+    """
+    name, idx = data['pc']
+    state = SymbolicExecutionState(blocks[name][idx],
+                                   program.get_variables_num(),
+                                   program.get_values_num())
+    exprs = iter(deserialize_exprs(data['exprs']))
+
+    pc = PathCondition()
+    for _ in range(data['constraints']):
+        pc = pc.push(next(exprs))
+    state.constraints = pc
+    for i in data['variables']:
+        state.variables[i] = next(exprs)
+    for i in data['values']:
+        state.values[i] = next(exprs)
+    state.model = Assignment.from_pairs([(next(exprs), next(exprs))
+                                         for _ in range(data['model'])])
+    state.error = data['error']
+    return state
+
+
+def _worker(path, optimize, query_cache, intervals, tasks, results, idle):
+    try:
+        program = Parser(path).parse()
+        if optimize:
+            # the optimizations are deterministic, the program is the same
+            # as the program of the coordinator
+            PassManager().run(program)
+        blocks = {blk.get_name(): blk for blk in program}
+        executor = SymbolicExecutor(program, query_cache=query_cache,
+                                    intervals=intervals)
+
+        while True:
+            with idle.get_lock():
+                idle.value += 1
+            task = tasks.get()
+            with idle.get_lock():
+                idle.value -= 1
+            if task is None:
+                if executor.disk_cache is not None:
+                    executor.disk_cache.close()
+                break
+
+            paths, errors = executor.executed_paths, executor.errors
+            checks = executor.solver.checks
+            unknown = executor.unknown_queries
+            worklist = [deserialize_state(task, program, blocks)]
+            steps = 0
+            while worklist:
+                state = worklist.pop()
+                worklist.extend(executor.executeInstruction(state))
+                steps += 1
+                if steps % DONATE_INTERVAL == 0 and len(worklist) > 1 and\
+                   idle.value > 0:
+                    half = len(worklist) // 2
+                    donated, worklist = worklist[:half], worklist[half:]
+                    results.put(('states',
+                                 [serialize_state(s) for s in donated]))
+
+            results.put(('done', executor.executed_paths - paths,
+                         executor.errors - errors,
+                         executor.solver.checks - checks,
+                         executor.unknown_queries - unknown,
+                         peak_memory()))
+    except Exception:
+        results.put(('error', format_exc()))
+
+
+class ParallelSymbolicExecutor(SymbolicExecutor):
+    """
+    Symbolic executor that explores the states in jobs processes,
+    path is the file with the program (every worker parses it on its own
+    and optimizes it if optimize is set)
+    """
+
+    def __init__(self, program, path, jobs, optimize=False,
+                 query_cache=None, intervals=False):
+        super().__init__(program)
+        self.path = path
+        self.jobs = jobs
+        self.optimize = optimize
+        # the workers open the cache, the coordinator does not query
+        self.query_cache = query_cache
+        # every worker analyzes its own copy of the program
+        self.use_intervals = intervals
+        self.solver_checks = 0
+        # the maximal peak memory of the workers
+        self.workers_memory = 0
+
+    def run(self):
+        ctx = get_context('spawn')
+        tasks, results = ctx.Queue(), ctx.Queue()
+        idle = ctx.Value('i', 0)
+        workers = [ctx.Process(target=_worker,
+                               args=(self.path, self.optimize,
+                                     self.query_cache, self.use_intervals,
+                                     tasks, results, idle))
+                   for _ in range(self.jobs)]
+        for w in workers:
+            w.start()
+
+        tasks.put(serialize_state(self.initialState()))
+        # number of states that were given to workers and not finished
+        pending = 1
+        try:
+            while pending:
+                msg = results.get()
+                if msg[0] == 'states':
+                    for s in msg[1]:
+                        tasks.put(s)
+                    pending += len(msg[1])
+                elif msg[0] == 'done':
+                    pending -= 1
+                    self.executed_paths += msg[1]
+                    self.errors += msg[2]
+                    self.solver_checks += msg[3]
+                    self.unknown_queries += msg[4]
+                    self.workers_memory = max(self.workers_memory, msg[5])
+                else:
+                    raise RuntimeError(f"Worker failed:\n{msg[1]}")
+        finally:
+            for w in workers:
+                tasks.put(None)
+            for w in workers:
+                w.join()
+
+        # the sequential executor counts the end of the exploration
+        # as a path too
+        self.executed_paths += 1
+        print(f"Executed paths: {self.executed_paths}")
+        print(f"Error paths: {self.errors}")
+        print(f"Solver calls: {self.solver_checks}")
+
+    def get_results(self):
+        """
+        Get the results, the coordinator does not query the solver,
+        the solver calls are those of the workers and the peak memory
+        is that of the largest process
+        """
+        results = super().get_results()
+        results['solver_calls'] = self.solver_checks
+        results['peak_memory_kb'] = max(results['peak_memory_kb'],
+                                        self.workers_memory)
+        results['jobs'] = self.jobs
+        return results
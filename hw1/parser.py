@@ -1,15 +1,48 @@
 from os.path import isfile
+from gc import disable, enable, isenabled
 from language import *
 from sys import stderr
 
 """
 Parser of our language that takes text form
-of the language and create its in-memory representation
+of the language and create its in-memory representation.
+
+The input is read in one pass, line by line. A jump may refer
+to a block that is defined later in the program, such a block is
+created when the jump is parsed and filled when its definition
+is reached. Blocks that are jumped to, but never defined, are reported
+at the end. Every line is split into tokens once and the statement
+is looked up by its first token (or by the opcode for instructions
+of the form 'name = opcode operands').
 """
 
 
-def _parse_block_name(line):
-    parts = line.split()
+# opcodes of instructions with two operands
+_BINARY = {
+    'add': Add,
+    'sub': Sub,
+    'mul': Mul,
+    'div': Div,
+}
+
+_PREDICATES = {
+    'le': Cmp.LE,
+    'lt': Cmp.LT,
+    'ge': Cmp.GE,
+    'gt': Cmp.GT,
+    'eq': Cmp.EQ,
+    'ne': Cmp.NE,
+}
+
+_CONDITIONS = {
+    'true': True,
+    'True': True,
+    'false': False,
+    'False': False,
+}
+
+
+def _parse_block_name(parts):
     if len(parts) != 2:
         raise RuntimeError(f"Invalid block statement: should be 'block name:'")
     if parts[0] != 'block':
@@ -22,76 +55,90 @@ def _parse_block_name(line):
 
 class Parser:
     def __init__(self, path):
+        """ path is the path to the file or an open text stream """
         self._path = path
         self.program = Program()
         self.blocks = {}
         self.variables = {}
         self.instructions = {}
         self._currentblk = None
+        # names of blocks that are jumped to but were not defined yet
+        # -> the line with the first jump
+        self._undefined = {}
+        self._line = None
+
+        # statements by their first token
+        self._statements = {
+            'block': self._parse_block,
+            'variables:': self._parse_variables,
+            'halt': self._parse_halt,
+            'store': self._parse_store,
+            'jump': self._parse_jump,
+            'print': self._parse_print,
+            'assert': self._parse_assert,
+        }
 
     def _get_file(self):
-        assert isfile(self._path), f"{path} is not a file"
+        assert isfile(self._path), f"{self._path} is not a file"
         return open(self._path, 'r')
 
     def _get_lines(self):
-        with self._get_file() as f:
-            for line in (l.strip() for l in f):
-                if line and not line.startswith(';'):
+        if hasattr(self._path, 'read'):
+            stream = self._path
+        else:
+            stream = self._get_file()
+        with stream as f:
+            for line in f:
+                line = line.strip()
+                if line and line[0] != ';':
                     yield line
 
-    def _get_blocks(self):
-        """
-        Parse the text and obtain blocks without
-        creating their contents (we need blocks
-        created before creating instructions as
-        blocks as targets of jump instructions.
-        """
-        def parse_line(line):
-            if not line.startswith('block'):
-                return
-            
-            name = _parse_block_name(line)
-            if self.blocks.get(name):
-                raise RuntimeError(f"Duplicated block name: '{name}'")
-
+    def _parse_block(self, parts):
+        name = _parse_block_name(parts)
+        blk = self._undefined.pop(name, None)
+        if blk is not None:
+            # the block that was created by a jump
+            blk = blk[0]
+        elif name in self.blocks:
+            raise RuntimeError(f"Duplicated block name: '{name}'")
+        else:
             blk = Block(name)
-            self.program.add_block(blk)
             self.blocks[name] = blk
 
-        for line in self._get_lines():
-             try:
-                 parse_line(line)
-             except RuntimeError as e:
-                 print(f"Error occured while parsing line: {line}",
-                       file=stderr)
-                 print(f"  {e}", file=stderr)
+        self.program.add_block(blk)
+        self._currentblk = blk
 
-    def _parse_variables(self, line):
-        parts = line.split()
-        if parts[0] != 'variables:':
-            raise RuntimeError("Wrong 'variables' clause")
+    def _get_block(self, name):
+        """ Get the block with the name, create it if it was not defined yet """
+        blk = self.blocks.get(name)
+        if blk is None:
+            blk = Block(name)
+            self.blocks[name] = blk
+            self._undefined[name] = (blk, self._line)
+        return blk
 
+    def _parse_variables(self, parts):
+        # we should check that this goes at the beginning, but what the
+        # hell...
         for varname in parts[1:]:
             if varname in self.variables:
-                raise RuntimeError(f"Duplicated variable: {var}")
+                raise RuntimeError(f"Duplicated variable: {varname}")
             var = Variable(varname)
             self.variables[varname] = var
             self.program.add_variable(var)
 
     def _get_op(self, op):
-        try:
-            opval = int(op)
-        except ValueError:
-            opval = self.instructions.get(op)
-        return opval
+        if op[0].isdigit() or op[0] in '+-':
+            try:
+                return int(op)
+            except ValueError:
+                pass
+        return self.instructions.get(op)
 
     def _get_cond(self, op):
         cond = self._get_op(op)
         if cond is None:
-            if op in ['true', 'True']:
-                cond = True
-            elif op in ['false', 'False']:
-                cond = False
+            cond = _CONDITIONS.get(op)
         return cond
 
     def _get_operands(self, ops):
@@ -104,145 +151,129 @@ class Parser:
                 raise RuntimeError(f"Invalid operand: {op}")
         return operands
 
-    def _parse_with_eq(self, line):
-        parts = line.split('=')
+    def _add(self, I):
+        if self._currentblk is None:
+            raise RuntimeError("Instruction outside of a block")
+        self._currentblk.add(I)
+
+    def _parse_halt(self, parts):
+        if len(parts) != 1:
+            raise RuntimeError("Invalid halt instruction")
+        self._add(Halt())
+
+    def _parse_store(self, parts):
+        if len(parts) != 4 or parts[2] != 'to':
+            raise RuntimeError(f"Invalid store instruction")
+        val = self._get_op(parts[1])
+        if val is None:
+            raise RuntimeError(f"Invalid value to store")
+        to = self.variables.get(parts[3])
+        if to is None:
+            raise RuntimeError(f"Invalid variable to store")
+        self._add(Store(val, to))
+
+    def _parse_jump(self, parts):
+        if len(parts) != 4:
+            raise RuntimeError("Invalid jump instruction")
+        cond = self._get_cond(parts[1])
+        if cond is None:
+            raise RuntimeError(f"Invalid jump condition: {parts[1]}")
+        T = self._get_block(parts[2])
+        F = self._get_block(parts[3])
+        self._add(Jump(cond, T, F))
+
+    def _parse_print(self, parts):
+        self._add(Print(self._get_operands(parts[1:])))
+
+    def _parse_assert(self, parts):
         if len(parts) != 2:
-            raise RuntimeError(f"Invalid instruction: {line}")
-        lhs = parts[0].strip()
+            raise RuntimeError("Invalid assertion")
+        cond = self._get_cond(parts[1])
+        if cond is None:
+            raise RuntimeError(f"Invalid assertion condition: {parts[1]}")
+        self._add(Assert(cond))
+
+    def _parse_value(self, lhs, rhs):
+        """ Parse the instruction 'lhs = rhs' that produces a value """
+        if not rhs:
+            raise RuntimeError(f"Invalid instruction: {self._line}")
         if self.instructions.get(lhs):
             raise RuntimeError(f"Duplicated instruction name: {lhs}")
 
-        rhs = parts[1].split()
-        if rhs[0] == 'load':
-            Instr = Load
+        opcode = rhs[0]
+        Instr = _BINARY.get(opcode)
+        if Instr is not None:
+            operands = self._get_operands(rhs[1:])
+            if len(operands) != 2:
+                raise RuntimeError(f"Invalid operands: {operands}")
+            I = Instr(*operands, name=lhs)
+        elif opcode == 'load':
             if len(rhs) != 2:
                 raise RuntimeError(f"Invalid load: should be 'x = load var'")
             var = self.variables.get(rhs[1])
             if var is None:
-                raise RuntimeError(f"Unknown variable: {var}")
-            operands = [var]
-        elif rhs[0] == 'cmp':
+                raise RuntimeError(f"Unknown variable: {rhs[1]}")
+            I = Load(var, name=lhs)
+        elif opcode == 'cmp':
             if len(rhs) != 4:
                 raise RuntimeError(f"Invalid cmp instruction: {rhs}")
-            Instr = Cmp
-            pred = None
-            if rhs[1] == 'le':
-                pred = Cmp.LE
-            elif rhs[1] == 'lt':
-                pred = Cmp.LT
-            elif rhs[1] == 'ge':
-                pred = Cmp.GE
-            elif rhs[1] == 'gt':
-                pred = Cmp.GT
-            elif rhs[1] == 'eq':
-                pred = Cmp.EQ
-            elif rhs[1] == 'ne':
-                pred = Cmp.NE
-            else:
+            pred = _PREDICATES.get(rhs[1])
+            if pred is None:
                 raise RuntimeError(f"Invalid cmp instruction predicate: {rhs[1]}")
             operands = self._get_operands(rhs[2:])
             if len(operands) != 2:
                 raise RuntimeError(f"Invalid cmp operands: {operands}")
-            return lhs, Cmp(pred, *operands)
+            I = Cmp(pred, *operands, name=lhs)
         else:
-            Instr = None
-            if rhs[0] == 'add':
-                Instr = Add
-            elif rhs[0] == 'sub':
-                Instr = Sub
-            elif rhs[0] == 'mul':
-                Instr = Mul
-            elif rhs[0] == 'div':
-                Instr = Div
-
-            if not Instr:
-                raise RuntimeError(f"Unrecognized instruction: {rhs[0]}")
-            operands = self._get_operands(rhs[1:])
-            if len(operands) != 2:
-                    raise RuntimeError(f"Invalid operands: {operands}")
-
-        I = Instr(*operands, name=lhs)
-        return lhs, I
-
-    def _parse_instruction(self, line, blk):
-        if line ==  'halt':
-            I = Halt()
-            blk.add(I)
-        elif line.startswith('store'):
-            parts = line.split()
-            if len(parts) != 4 or parts[2] != 'to':
-                raise RuntimeError(f"Invalid store instruction")
-            val = self._get_op(parts[1])
-            if val is None:
-                raise RuntimeError(f"Invalid value to store")
-            to = self.variables.get(parts[3])
-            if to is None:
-                raise RuntimeError(f"Invalid variable to store")
-            I = Store(val, to)
-            blk.add(I)
-        elif line.startswith('jump'):
-            parts = line.split()
-            if len(parts) != 4:
-                raise RuntimeError("Invalid jump instruction")
-            cond = self._get_cond(parts[1])
-            if cond is None:
-                raise RuntimeError(f"Invalid jump condition: {parts[1]}")
-            T = self.blocks.get(parts[2])
-            if T is None:
-                raise RuntimeError(f"Invalid jump target: {parts[2]}")
-            F = self.blocks.get(parts[3])
-            if F is None:
-                raise RuntimeError(f"Invalid jump target: {parts[3]}")
-            I = Jump(cond, T, F)
-            blk.add(I)
-        elif line.startswith('print'):
-            parts = line.split()
-            operands = self._get_operands(parts[1:])
-            I = Print(operands)
-            blk.add(I)
-        elif line.startswith('assert'):
-            parts = line.split()
-            if len(parts) != 2:
-                raise RuntimeError("Invalid assertion")
-            cond = self._get_cond(parts[1])
-            if cond is None:
-                raise RuntimeError(f"Invalid assertion condition: {parts[1]}")
-            I = Assert(cond)
-            blk.add(I)
+            raise RuntimeError(f"Unrecognized instruction: {opcode}")
+
+        self._add(I)
+        self.instructions[lhs] = I
+        self.program.add_value(I)
+
+    def _parse_with_eq(self, line):
+        """ Parse the instruction with '=' not surrounded by spaces """
+        parts = line.split('=')
+        if len(parts) != 2:
+            raise RuntimeError(f"Invalid instruction: {line}")
+        self._parse_value(parts[0].strip(), parts[1].split())
+
+    def _parse_line(self, line):
+        parts = line.split()
+        statement = self._statements.get(parts[0])
+        if statement is not None:
+            statement(parts)
+        elif len(parts) > 1 and parts[1] == '=':
+            self._parse_value(parts[0], parts[2:])
         elif '=' in line:
-            lhs, I = self._parse_with_eq(line)
-            self.instructions[lhs] = I
-            blk.add(I)
+            self._parse_with_eq(line)
 
-    def _check_program(self):
-        pass
+    def _report(self, line, e):
+        print(f"Error occured while parsing line: {line}", file=stderr)
+        print(f"  {e}", file=stderr)
 
     def parse(self):
-        self._get_blocks()
-        # now parse instructions and assign them to the block
-
-        def parse_line(line):
-            if line.startswith('block'):
-                self._currentblk = self.blocks[_parse_block_name(line)]
-                assert self._currentblk, "BUG: do not have a block"
-            elif line.startswith('variables:'):
-                # we should check that this goes at the beginning, but what the
-                # hell...
-                self._parse_variables(line)
-            else:
-                assert self._currentblk
-                self._parse_instruction(line, self._currentblk)
-
-        for line in self._get_lines():
-             try:
-                 parse_line(line)
-             except RuntimeError as e:
-                 print(f"Error occured while parsing line: {line}",
-                       file=stderr)
-                 print(f"  {e}", file=stderr)
-                 return None
-
-        self._check_program()
+        # the parser creates lots of objects and no garbage, do not let
+        # the garbage collector traverse them over and over again
+        gc_enabled = isenabled()
+        disable()
+        try:
+            for line in self._get_lines():
+                self._line = line
+                self._parse_line(line)
+        except RuntimeError as e:
+            self._report(self._line, e)
+            return None
+        finally:
+            if gc_enabled:
+                enable()
+
+        for name, (_, line) in self._undefined.items():
+            self._report(line, f"Invalid jump target: {name}")
+            return None
+        if self._currentblk is None:
+            self._report("", "The program has no blocks")
+            return None
         return self.program
 
 
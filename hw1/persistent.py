@@ -0,0 +1,129 @@
+"""
+Persistent data structures for symbolic execution states.
+
+Forked states share structure with their parent: the path condition
+is an immutable cons-list, so siblings share the common prefix,
+and registers are kept in a chunked vector whose chunks are copied
+lazily on the first write after a fork.
+"""
+
+
+class PathCondition:
+    """
+    Immutable list of constraints. Adding a constraint creates
+    a new node that points to the old list, the old list is shared.
+    Iteration goes from the newest constraint to the oldest one.
+    """
+
+    __slots__ = ('_head', '_tail', '_len')
+
+    def __init__(self, head=None, tail=None):
+        self._head = head
+        self._tail = tail
+        self._len = 0 if tail is None else tail._len + 1
+
+    def push(self, constraint):
+        """ Get a new path condition extended with the constraint """
+        return PathCondition(constraint, self)
+
+    def get_head(self):
+        """ Get the newest constraint """
+        assert self._tail is not None, "Empty path condition"
+        return self._head
+
+    def get_tail(self):
+        """ Get the path condition without the newest constraint """
+        return self._tail
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        node = self
+        while node._tail is not None:
+            yield node._head
+            node = node._tail
+
+    def __repr__(self):
+        return repr(list(reversed(list(self))))
+
+
+class Registers:
+    """
+    Vector of values with copy-on-write chunks. copy() is O(1),
+    the copy and the original share all the chunks and whichever
+    of them writes to a shared chunk first makes its private copy.
+    """
+
+    CHUNK_BITS = 5
+    CHUNK_SIZE = 1 << CHUNK_BITS
+    CHUNK_MASK = CHUNK_SIZE - 1
+
+    __slots__ = ('_chunks', '_owner', '_owns_chunks', '_size')
+
+    def __init__(self, size=0):
+        self._size = size
+        # None stands for a chunk full of Nones, every chunk carries
+        # the token of its owner in its last item
+        self._chunks = [None] * ((size + Registers.CHUNK_MASK)
+                                 >> Registers.CHUNK_BITS)
+        self._owner = object()
+        self._owns_chunks = True
+
+    def copy(self):
+        n = Registers.__new__(Registers)
+        n._size = self._size
+        n._chunks = self._chunks
+        n._owner = object()
+        n._owns_chunks = False
+        # from now on, all chunks are shared
+        self._owner = object()
+        self._owns_chunks = False
+        return n
+
+    def __getitem__(self, idx):
+        chunk = self._chunks[idx >> Registers.CHUNK_BITS]
+        if chunk is None:
+            return None
+        return chunk[idx & Registers.CHUNK_MASK]
+
+    def __setitem__(self, idx, val):
+        chunks = self._chunks
+        if not self._owns_chunks:
+            chunks = self._chunks = chunks.copy()
+            self._owns_chunks = True
+
+        owner = self._owner
+        cidx = idx >> Registers.CHUNK_BITS
+        chunk = chunks[cidx]
+        if chunk is None:
+            chunk = [None] * Registers.CHUNK_SIZE
+            chunk.append(owner)
+            chunks[cidx] = chunk
+        elif chunk[Registers.CHUNK_SIZE] is not owner:
+            chunk = chunk.copy()
+            chunk[Registers.CHUNK_SIZE] = owner
+            chunks[cidx] = chunk
+        chunk[idx & Registers.CHUNK_MASK] = val
+
+    def drop(self, idx):
+        """ Set the item to None, release the chunk if it gets empty """
+        cidx = idx >> Registers.CHUNK_BITS
+        chunk = self._chunks[cidx]
+        if chunk is None or chunk[idx & Registers.CHUNK_MASK] is None:
+            return
+        self[idx] = None
+        # the owner token is not None, so all the values are None
+        # if the chunk contains CHUNK_SIZE Nones
+        if self._chunks[cidx].count(None) == Registers.CHUNK_SIZE:
+            self._chunks[cidx] = None
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for idx in range(self._size):
+            yield self[idx]
+
+    def __repr__(self):
+        return repr(list(self))
@@ -0,0 +1,156 @@
+"""
+Profiler of the interpreter and the symbolic executor.
+
+The profiler is attached to an executor object by wrapping its methods
+on the instance (executeInstruction, the checks of the solver session
+and pop() of the scheduler), the classes are not changed. So executors
+without a profiler run exactly the same code as before.
+
+The profiler counts instructions executed in every block and forks
+of every jump, measures the time of every instruction and the number
+and the time of solver calls made while executing it (the instruction
+is the branch site of the calls) and samples the number of pending
+states on every pop from the worklist. The timeline keeps at most
+a given number of points, when it gets full, every other point is
+dropped and the sampling interval doubles.
+
+The results are written as JSON or as collapsed stacks for flame graphs
+(block;instruction and block;instruction;solver frames weighted by
+microseconds).
+"""
+
+from time import perf_counter
+import json
+
+from language import Instruction
+from solversession import SolverSession
+
+
+def site_name(instruction):
+    """ Get the name of the instruction for reports """
+    return f"{instruction.get_block().get_name()}:" \
+           f"{instruction.get_block_idx()} {instruction}"
+
+
+class Profiler:
+    def __init__(self, timeline_points=1000):
+        # block -> number of executed instructions
+        self.blocks = {}
+        # jump -> number of executions that forked the state
+        self.forks = {}
+        # instruction -> time of its executions (with the solver)
+        self.times = {}
+        # instruction -> number of solver calls and their time
+        self.solver_calls = {}
+        self.solver_times = {}
+        # pairs (number of pops, number of pending states)
+        self.timeline = []
+        self.timeline_points = timeline_points
+        self._stride = 1
+        self._pops = 0
+        # instruction being executed
+        self._site = None
+
+    def attach(self, executor):
+        """ Profile the executor """
+        execute = executor.executeInstruction
+
+        def executeInstruction(state):
+            instruction = state.pc
+            self._site = instruction
+            start = perf_counter()
+            result = execute(state)
+            elapsed = perf_counter() - start
+            blk = instruction.get_block()
+            self.blocks[blk] = self.blocks.get(blk, 0) + 1
+            self.times[instruction] = self.times.get(instruction, 0) + elapsed
+            if instruction.get_ty() == Instruction.JUMP and\
+               isinstance(result, list) and len(result) > 1:
+                self.forks[instruction] = self.forks.get(instruction, 0) + 1
+            return result
+
+        executor.executeInstruction = executeInstruction
+
+        solver = getattr(executor, 'solver', None)
+        if isinstance(solver, SolverSession):
+            solver.check = self._timed(solver.check)
+            solver.check_constraints = self._timed(solver.check_constraints)
+
+        scheduler = getattr(executor, 'scheduler', None)
+        if scheduler is not None:
+            pop = scheduler.pop
+
+            def sample():
+                self._pops += 1
+                if self._pops % self._stride == 0:
+                    self._sample(len(scheduler))
+                return pop()
+
+            scheduler.pop = sample
+
+    def _timed(self, check):
+        def timed(*args):
+            start = perf_counter()
+            try:
+                return check(*args)
+            finally:
+                site = self._site
+                self.solver_calls[site] = self.solver_calls.get(site, 0) + 1
+                self.solver_times[site] = self.solver_times.get(site, 0) +\
+                                          perf_counter() - start
+        return timed
+
+    def _sample(self, size):
+        self.timeline.append((self._pops, size))
+        if len(self.timeline) >= self.timeline_points:
+            del self.timeline[1::2]
+            self._stride *= 2
+
+    def to_dict(self):
+        """ Get the results as a dictionary for JSON """
+        sites = sorted(self.solver_times, key=self.solver_times.get,
+                       reverse=True)
+        return {
+            'blocks': {blk.get_name(): n for blk, n in
+                       sorted(self.blocks.items(), key=lambda i: -i[1])},
+            'forks': {site_name(j): n for j, n in
+                      sorted(self.forks.items(), key=lambda i: -i[1])},
+            'solver': [{'site': site_name(s) if s is not None else None,
+                        'calls': self.solver_calls[s],
+                        'time': self.solver_times[s]} for s in sites],
+            'worklist': [{'pops': p, 'size': n} for p, n in self.timeline],
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def collapsed_stacks(self):
+        """ Get the lines of the collapsed-stack format """
+        lines = []
+        for instruction, elapsed in self.times.items():
+            frame = f"{instruction.get_block().get_name()};" \
+                    f"{site_name(instruction)}"
+            solver = self.solver_times.get(instruction, 0)
+            own = int((elapsed - solver) * 1e6)
+            if own > 0:
+                lines.append(f"{frame} {own}")
+            if solver > 0:
+                lines.append(f"{frame};solver {int(solver * 1e6)}")
+        return lines
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            for line in self.collapsed_stacks():
+                print(line, file=f)
+
+
+def trace(executor):
+    """ Print every instruction that the executor executes """
+    execute = executor.executeInstruction
+
+    def executeInstruction(state):
+        print('executing:', state.pc)
+        return execute(state)
+
+    executor.executeInstruction = executeInstruction
@@ -0,0 +1,181 @@
+"""
+Reducing the number and the size of solver queries.
+
+ConstraintSlicer splits the path condition into groups of constraints
+that (transitively) share symbolic variables and keeps only the group
+that is relevant to the checked condition -- the other groups are
+satisfiable, as the path condition is satisfiable.
+
+QueryCache remembers results of queries (sets of constraints) in an LRU
+cache. Besides exact hits, a query is known to be unsat if any of its
+subsets is unsat, and known to be sat if any of its supersets is sat.
+Expressions are hash-consed by z3, so the set of ids of the constraints
+is a canonical form of the query. Together with sat results, the cache
+keeps the models (assignments of symbols) found by the solver.
+"""
+
+from collections import OrderedDict
+from z3 import is_const, Z3_OP_UNINTERPRETED
+
+
+class ConstraintSlicer:
+    def __init__(self, size=65536):
+        # id of expression -> (expression, ids of its symbols),
+        # we keep the expression so that its id is not reused
+        self._symbols = {}
+        self._size = size
+        # id of symbol -> symbol
+        self._consts = {}
+
+    def symbols(self, expr):
+        """ Get the ids of symbolic variables that occur in expr """
+        eid = expr.get_id()
+        cached = self._symbols.get(eid)
+        if cached is not None:
+            return cached[1]
+
+        symbols = set()
+        visited = set()
+        stack = [expr]
+        while stack:
+            e = stack.pop()
+            if e.get_id() in visited:
+                continue
+            visited.add(e.get_id())
+            if is_const(e):
+                if e.decl().kind() == Z3_OP_UNINTERPRETED:
+                    symbols.add(e.get_id())
+                    self._consts[e.get_id()] = e
+            else:
+                stack.extend(e.children())
+
+        if len(self._symbols) >= self._size:
+            self._symbols.clear()
+        symbols = frozenset(symbols)
+        self._symbols[eid] = (expr, symbols)
+        return symbols
+
+    def symbols_of(self, exprs):
+        """ Get the ids of symbolic variables that occur in exprs """
+        symbols = set()
+        for e in exprs:
+            symbols |= self.symbols(e)
+        return symbols
+
+    def consts(self, symbols):
+        """ Get the symbolic variables with the given ids """
+        return [self._consts[sid] for sid in symbols]
+
+    def slice(self, constraints, condition):
+        """
+        Get the constraints that are relevant to the satisfiability
+        of the condition, i.e., the constraints that share symbols
+        with the condition directly or through other constraints
+        """
+        parent = {}
+
+        def find(x):
+            root = parent.setdefault(x, x)
+            while root != parent[root]:
+                root = parent[root]
+            while x != root:
+                parent[x], x = root, parent[x]
+            return root
+
+        def union(symbols):
+            it = iter(symbols)
+            root = find(next(it))
+            for s in it:
+                parent[find(s)] = root
+            return root
+
+        condsymbols = self.symbols(condition)
+        if not condsymbols:
+            return []
+        union(condsymbols)
+
+        grouped = []
+        for c in constraints:
+            symbols = self.symbols(c)
+            # constant constraints are true, the path condition is sat
+            if symbols:
+                grouped.append((c, union(symbols)))
+
+        root = find(next(iter(condsymbols)))
+        return [c for c, s in grouped if find(s) == root]
+
+
+class QueryCache:
+    def __init__(self, size=4096):
+        self._size = size
+        # key -> (constraints, result, model)
+        self._entries = OrderedDict()
+        # indexes for subset/superset lookups:
+        # unsat keys by their smallest id, sat keys by every id
+        self._unsat = {}
+        self._sat = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, query):
+        return frozenset(c.get_id() for c in query)
+
+    def lookup(self, query):
+        """
+        Get the cached result for the query (a list of constraints),
+        the pair (True, model) for sat, (False, None) for unsat
+        and None if the result is unknown. The model may be None.
+        """
+        key = self.key(query)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+        for cid in key:
+            for other in self._unsat.get(cid, ()):
+                if other <= key:
+                    self._entries.move_to_end(other)
+                    self.hits += 1
+                    return False, None
+
+        if key:
+            rarest = min(key, key=lambda cid: len(self._sat.get(cid, ())))
+            for other in self._sat.get(rarest, ()):
+                if key <= other:
+                    self._entries.move_to_end(other)
+                    self.hits += 1
+                    return True, self._entries[other][2]
+
+        self.misses += 1
+        return None
+
+    def store(self, query, result, model=None):
+        """ Store the result (True for sat, False for unsat) of the query """
+        key = self.key(query)
+        if key in self._entries:
+            return
+        self._entries[key] = (query, result, model)
+        if result:
+            for cid in key:
+                self._sat.setdefault(cid, set()).add(key)
+        elif key:
+            self._unsat.setdefault(min(key), set()).add(key)
+
+        if len(self._entries) > self._size:
+            self._evict()
+
+    def _evict(self):
+        key, (_, result, _) = self._entries.popitem(last=False)
+        if result:
+            for cid in key:
+                keys = self._sat[cid]
+                keys.discard(key)
+                if not keys:
+                    del self._sat[cid]
+        elif key:
+            keys = self._unsat[min(key)]
+            keys.discard(key)
+            if not keys:
+                del self._unsat[min(key)]
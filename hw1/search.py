@@ -0,0 +1,174 @@
+"""
+Search strategies for the symbolic executor.
+
+A scheduler keeps the pending states and decides which one is executed
+next. The executor pops a state, executes one instruction and gives
+the resulting states (the successors of the popped state) back to the
+scheduler with add().
+"""
+
+from collections import deque
+from heapq import heappush, heappop
+from random import Random
+
+
+class Scheduler:
+    """ Base class of search strategies """
+
+    def add(self, states):
+        """
+        Add the successors of the last popped state,
+        or the initial states if no state was popped yet
+        """
+        raise NotImplementedError
+
+    def pop(self):
+        """ Remove and return the state that should be executed next """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class DFS(Scheduler):
+    """ Depth-first search, keeps the least states in memory """
+
+    def __init__(self, seed=None):
+        self._states = []
+
+    def add(self, states):
+        self._states.extend(states)
+
+    def pop(self):
+        return self._states.pop()
+
+    def __len__(self):
+        return len(self._states)
+
+
+class BFS(Scheduler):
+    """ Breadth-first search """
+
+    def __init__(self, seed=None):
+        self._states = deque()
+
+    def add(self, states):
+        self._states.extend(states)
+
+    def pop(self):
+        return self._states.popleft()
+
+    def __len__(self):
+        return len(self._states)
+
+
+class _Node:
+    """ Node of the tree of forks used by the random-path search """
+
+    __slots__ = ('parent', 'children', 'state', 'live')
+
+    def __init__(self, parent, state=None):
+        self.parent = parent
+        self.children = []
+        self.state = state
+        # number of pending states in the subtree
+        self.live = 0
+
+
+class RandomPath(Scheduler):
+    """
+    Random-path search: walk the tree of forks from the root choosing
+    the children at random. States that forked less often are chosen
+    with higher probability, which prevents starving the states
+    close to the root by long loops that fork a lot.
+    """
+
+    def __init__(self, seed=None):
+        self._random = Random(seed)
+        self._root = _Node(None)
+        self._current = self._root
+
+    def _update_live(self, node, diff):
+        while node is not None:
+            node.live += diff
+            node = node.parent
+
+    def _remove(self, node):
+        # remove the dead branch of the tree
+        while node.parent is not None and node.live == 0\
+              and not node.children:
+            parent = node.parent
+            parent.children.remove(node)
+            node = parent
+
+    def add(self, states):
+        node = self._current
+        if len(states) == 1 and node is not self._root:
+            node.state = states[0]
+            self._update_live(node, 1)
+            return
+
+        for state in states:
+            child = _Node(node, state)
+            node.children.append(child)
+            self._update_live(child, 1)
+        self._remove(node)
+
+    def pop(self):
+        node = self._root
+        while node.state is None:
+            node = self._random.choice([c for c in node.children if c.live])
+        state, node.state = node.state, None
+        self._update_live(node, -1)
+        self._current = node
+        return state
+
+    def __len__(self):
+        return self._root.live
+
+
+class CoverageSearch(Scheduler):
+    """
+    Prefer states that are about to execute a block that was executed
+    the least number of times, i.e., states that reach new blocks.
+    """
+
+    def __init__(self, seed=None):
+        self._heap = []
+        self._counter = 0
+        # block -> how many times it was executed
+        self._coverage = {}
+
+    def _priority(self, state):
+        return self._coverage.get(state.pc.get_block(), 0)
+
+    def add(self, states):
+        for state in states:
+            self._counter += 1
+            heappush(self._heap, (self._priority(state), self._counter, state))
+
+    def pop(self):
+        while True:
+            prio, counter, state = heappop(self._heap)
+            # the priority might be outdated, re-insert the state if there
+            # is a better candidate
+            current = self._priority(state)
+            if current == prio or not self._heap or current <= self._heap[0][0]:
+                break
+            heappush(self._heap, (current, counter, state))
+
+        if state.pc.get_block_idx() == 0:
+            block = state.pc.get_block()
+            self._coverage[block] = self._coverage.get(block, 0) + 1
+        return state
+
+    def __len__(self):
+        return len(self._heap)
+
+
+STRATEGIES = {
+    'dfs': DFS,
+    'bfs': BFS,
+    'random-path': RandomPath,
+    'coverage': CoverageSearch,
+}
@@ -0,0 +1,83 @@
+"""
+Incremental solver session for checking feasibility of branches.
+
+The session keeps one live solver for the exploration. Constraints of
+the path condition of the last checked state stay asserted, one push()
+scope per constraint. When the next state is checked, only the scopes
+that are not shared with its path condition are popped and the missing
+constraints are pushed (path conditions of forked states share nodes,
+see persistent.py, so the common prefix is found by identity).
+The branch condition itself is passed as an assumption, so the solver
+keeps what it learned across the queries. Queries that do not need
+the whole path condition (see querycache.py) are checked in a second
+solver with all the constraints passed as assumptions.
+"""
+
+from z3 import Solver
+
+
+class SolverSession:
+    def __init__(self, timeout=None):
+        # timeout of every check in seconds, checks that time out
+        # are unknown
+        self._timeout = timeout
+        self.solver = self._new_solver()
+        # solver for queries that are independent of the asserted path
+        self._scratch = None
+        self._last = self.solver
+        # nodes of the path condition that are asserted in the solver,
+        # the i-th node is asserted in the (i+1)-th scope
+        self._asserted = []
+        # number of check() calls
+        self.checks = 0
+
+    def _new_solver(self):
+        solver = Solver()
+        if self._timeout is not None:
+            solver.set(timeout=max(1, int(self._timeout * 1000)))
+        return solver
+
+    def _sync(self, pc):
+        """ Make the asserted constraints equal to the path condition pc """
+        missing = []
+        node = pc
+        while len(node) > len(self._asserted):
+            missing.append(node)
+            node = node.get_tail()
+
+        keep = len(node)
+        while keep > 0 and self._asserted[keep - 1] is not node:
+            missing.append(node)
+            node = node.get_tail()
+            keep -= 1
+
+        if keep < len(self._asserted):
+            self.solver.pop(len(self._asserted) - keep)
+            del self._asserted[keep:]
+
+        for node in reversed(missing):
+            self.solver.push()
+            self.solver.add(node.get_head())
+            self._asserted.append(node)
+
+    def check(self, pc, condition):
+        """
+        Check the satisfiability of the path condition pc
+        together with the condition
+        """
+        self._sync(pc)
+        self.checks += 1
+        self._last = self.solver
+        return self.solver.check(condition)
+
+    def check_constraints(self, constraints):
+        """ Check the satisfiability of the constraints on their own """
+        if self._scratch is None:
+            self._scratch = self._new_solver()
+        self.checks += 1
+        self._last = self._scratch
+        return self._scratch.check(*constraints)
+
+    def model(self):
+        """ Get the model from the last satisfiable check """
+        return self._last.model()
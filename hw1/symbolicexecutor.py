@@ -2,15 +2,46 @@
 
 from language import Instruction, Variable, Cmp
 from interpreter import ExecutionState, Interpreter
+from persistent import PathCondition, Registers
+from solversession import SolverSession
+from querycache import ConstraintSlicer, QueryCache
+from assignment import Assignment
+from search import STRATEGIES
+from cfg import ControlFlowGraph
+from merging import StateMerger
+from loops import LoopAccelerator
+from diskcache import DiskQueryCache
+from budget import Budget, peak_memory
+from intervals import IntervalAnalysis
+from expressions import ExpressionFactory, WIDTHS
 from z3 import *
 
 
 class SymbolicExecutionState(ExecutionState):
-    def __init__(self, pc):
+    # constants and expressions are built once for all states,
+    # see expressions.py, integers unless the executor sets other
+    expressions = ExpressionFactory()
+
+    def __init__(self, pc, variables_num=0, values_num=0, expressions=None):
         super().__init__(pc)
+        if expressions is not None:
+            self.expressions = expressions
+        # forked states share the path condition and registers
+        # with their parent, see persistent.py
+        self.variables = Registers(variables_num)
+        self.values = Registers(values_num)
 
         # add constraints here
-        self.constraints = [True]
+        self.constraints = PathCondition()
+        # assignment that satisfies the constraints
+        self.model = Assignment()
+        # guards of the paths that a merged state stands for,
+        # None for a state of a single path, see merging.py
+        self.paths = None
+        # loop header -> number of iterations of the loop on the path
+        # (only with a bound on unrolling), the dictionary is never
+        # modified, only replaced
+        self.iterations = {}
         # dont forget to create _copy_ of attributes
         # when forking states (i.e., dont use
         # new.attr = old.attr, that would
@@ -19,55 +50,125 @@ class SymbolicExecutionState(ExecutionState):
     def write(self, var, value):
         assert isinstance(var, Variable)
         # in symbolic execution, value is expression, not int...
-        assert isinstance(value, (ArithRef, IntNumRef, BoolRef))
+        assert isinstance(value, (ArithRef, BitVecRef, BoolRef))
         assert is_expr(value)
-        self.variables[var] = value
+        self.variables[var.get_slot()] = value
 
     def eval(self, v):
-        if isinstance(v, bool):
-            return BoolVal(v) # convert int to z3 BoolVal
-        # NOTE: this must be before IntVal, since True/False
-        # match also IntVal
         if isinstance(v, int):
-            return IntVal(v) # convert int to z3 IntVal
+            # interned z3 IntVal or BoolVal (True/False are ints too)
+            return self.expressions.const(v)
         assert isinstance(v, Instruction)
-        return self.values.get(v)
+        return self.values[v.get_slot()]
 
     def copy(self):
         # must be overriden for symbolic execution
         # if you add new attributes
         n = SymbolicExecutionState(self.pc)
-        n.constraints = self.constraints.copy()
+        # the path condition is immutable, it can be shared
+        n.constraints = self.constraints
+        n.model = self.model
+        n.paths = self.paths
+        n.iterations = self.iterations
+        n.expressions = self.expressions
         n.variables = self.variables.copy()
         n.values = self.values.copy()
         n.error = self.error
         return n
 
+    def add_constraint(self, constraint, model):
+        """
+        Extend the path condition with the constraint, model is
+        an assignment that satisfies the extended path condition
+        """
+        self.constraints = self.constraints.push(constraint)
+        self.model = model
+
+    def get_paths(self):
+        """ Get the guards of the paths that the state stands for """
+        if self.paths is None:
+            return [BoolVal(True)]
+        return self.paths
+
+    def multiplicity(self):
+        """ Get the number of paths that the state stands for """
+        return 1 if self.paths is None else len(self.paths)
+
     def read(self, var):
         assert isinstance(var, Variable)
-        return self.variables.get(var)
+        return self.variables[var.get_slot()]
+
+    def forget(self, values, variables):
+        for slot in values:
+            self.values.drop(slot)
+        for slot in variables:
+            self.variables.drop(slot)
 
     def set(self, lhs, val):
         assert isinstance(lhs, Instruction)
         # in symbolic execution, val is expression, not int...
-        assert isinstance(val, (ArithRef, IntNumRef, BoolRef))
-        self.values[lhs] = val
+        assert isinstance(val, (ArithRef, BitVecRef, BoolRef))
+        self.values[lhs.get_slot()] = val
 
     def __repr__(self):
-        variables = {x.get_name() : v for (x, v) in self.variables.items()}
-        values = {x.get_name() : v for (x, v) in self.values.items()}
         return f"[\n"\
                f"pc: {self.pc}\n"\
-               f"variables: {variables}\n"\
-               f"values: {values}\n"\
+               f"constraints: {self.constraints}\n"\
+               f"variables: {self.variables}\n"\
+               f"values: {self.values}\n"\
                 "]"
 
 
 class SymbolicExecutor(Interpreter):
-    def __init__(self, program):
-        super().__init__(program)
+    def __init__(self, program, search='dfs', seed=None, merge=False,
+                 accelerate=False, unroll_bound=None, query_cache=None,
+                 budget=None, prune=True, width=None, intervals=False):
+        super().__init__(program, prune)
+        # integers or bit-vectors of the width, see expressions.py
+        self.expressions = SymbolicExecutionState.expressions
+        if width is not None:
+            self.expressions = ExpressionFactory(width)
+        # the search strategy, see search.py
+        self.scheduler = STRATEGIES[search](seed)
+        cfg = None
+        if merge or accelerate or intervals or unroll_bound is not None:
+            cfg = ControlFlowGraph(program)
+        # merging of states at joins, see merging.py
+        self.merger = StateMerger(program, cfg) if merge else None
+        # summaries of loops, see loops.py (they are built
+        # with integer arithmetic, so not for bit-vectors)
+        assert not (accelerate and width is not None)
+        self.accelerator = LoopAccelerator(cfg) if accelerate else None
+        self.accelerated = 0
+        # maximal number of iterations of a loop on a path
+        self.unroll_bound = unroll_bound
+        self.bounded_paths = 0
+        self.loops = {}
+        if cfg is not None:
+            self.loops = {loop.header: loop for loop in cfg.loops}
+        # jumps and assertions decided statically, see intervals.py
+        # (sound for integers only)
+        assert not (intervals and width is not None)
+        self.intervals = IntervalAnalysis(program, cfg) if intervals else None
+        self.proven_checks = 0
         self.executed_paths = 0
         self.errors = 0
+        # limits of the exploration, see budget.py
+        self.budget = budget
+        # the exhausted resource if the exploration was stopped
+        self.stopped = None
+        self.depth_bounded = 0
+        self.unknown_queries = 0
+        self.states_left = 0
+        self.solver = SolverSession(
+            None if budget is None else budget.solver_timeout)
+        self.slicer = ConstraintSlicer()
+        self.cache = QueryCache()
+        # results of queries from earlier runs, see diskcache.py
+        self.disk_cache = None
+        if query_cache is not None:
+            self.disk_cache = DiskQueryCache(
+                query_cache, theory=self.expressions.theory())
 
     def executeMem(self, state):
         instruction = state.pc
@@ -76,7 +177,7 @@ class SymbolicExecutor(Interpreter):
         if ty == Instruction.LOAD:
             value = state.read(op)
             if value is None:
-                state.set(instruction, Int(op._name))
+                state.set(instruction, self.expressions.symbol(op._name))
             else:
                 state.set(instruction, value)
         elif ty == Instruction.STORE:
@@ -100,17 +201,10 @@ class SymbolicExecutor(Interpreter):
             return state
 
         ty = instruction.get_ty()
-        if ty == Instruction.ADD:
-            result = a + b
-        elif ty == Instruction.SUB:
-            result = a - b
-        if ty == Instruction.MUL:
-            result = a * b
-        if ty == Instruction.DIV:
-            if b == 0:
-                state.error = f"Division by 0: {instruction}"
-                return state
-            result = a / b
+        if ty == Instruction.DIV and b == 0:
+            state.error = f"Division by 0: {instruction}"
+            return state
+        result = self.expressions.arith(ty, a, b)
 
         state.set(instruction, result)
 
@@ -145,20 +239,10 @@ class SymbolicExecutor(Interpreter):
             state.error = f"Using unknown value: {cmpinst.get_operand(1)}"
             return state
 
-        if predicate == Cmp.LT:
-            result = a < b
-        elif predicate == Cmp.LE:
-            result = a <= b
-        elif predicate == Cmp.GT:
-            result = a > b
-        elif predicate == Cmp.GE:
-            result = a >= b
-        elif predicate == Cmp.EQ:
-            result = a == b
-        elif predicate == Cmp.NE:
-            result = a != b
-        else:
+        if predicate not in (Cmp.LT, Cmp.LE, Cmp.GT,
+                             Cmp.GE, Cmp.EQ, Cmp.NE):
             raise RuntimeError(f"Invalid comparison: {cmpinst}")
+        result = self.expressions.cmp(predicate, a, b)
 
         state.set(cmpinst, result)
 
@@ -167,7 +251,6 @@ class SymbolicExecutor(Interpreter):
     def executeInstruction(self, state):
         instruction = state.pc
         ty = instruction.get_ty()
-        print('executing:', instruction)
 
         if ty == Instruction.JUMP:
             return self.executeJump(state)
@@ -182,7 +265,7 @@ class SymbolicExecutor(Interpreter):
         elif ty == Instruction.PRINT:
             state = [self.executePrint(state)]
         elif ty == Instruction.HALT:
-            self.executed_paths += 1
+            self.executed_paths += state.multiplicity()
             return [] # kill the execution
         elif ty == Instruction.ASSERT:
             state = self.executeAssert(state)
@@ -197,12 +280,110 @@ class SymbolicExecutor(Interpreter):
 
         return state
 
+    def checkBranch(self, state, condval):
+        """
+        Check which sides of a branch on condval are feasible on the path
+        of the state. Returns the pair of assignments that satisfy the path
+        condition extended with condval and with Not(condval), None stands
+        for an infeasible side. The solver is not called for conditions
+        that fold to a constant, for jumps and assertions decided
+        by the interval analysis and for the side that is witnessed
+        by the assignment of the state.
+        """
+        if self.intervals is not None:
+            proven = self.intervals.proven(state.pc)
+            if proven is not None:
+                self.proven_checks += 1
+                return (state.model, None) if proven else \
+                       (None, state.model)
+        folded = self.expressions.value(condval)
+        if type(folded) is not bool:
+            folded = simplify(condval)
+            folded = True if is_true(folded) else \
+                     False if is_false(folded) else None
+        if folded is True:
+            return state.model, None
+        if folded is False:
+            return None, state.model
+
+        negation = self.expressions.negation(condval)
+        witness = state.model.evaluate(condval)
+        if witness is True:
+            return state.model, self.isFeasible(state, negation)
+        if witness is False:
+            return self.isFeasible(state, condval), state.model
+        return (self.isFeasible(state, condval),
+                self.isFeasible(state, negation))
+
+    def isFeasible(self, state, condition):
+        """
+        Check whether the condition is satisfiable on the path of the state,
+        return an assignment that satisfies the path condition extended with
+        the condition or None if it is not satisfiable. Only the constraints
+        that share symbols with the condition are checked and the results
+        are cached.
+        """
+        pc = state.constraints
+        query = self.slicer.slice(pc, condition)
+        query.append(condition)
+        symbols = self.slicer.symbols_of(query)
+
+        cached = self.cache.lookup(query)
+        if cached is not None:
+            result, model = cached
+            if not result:
+                return None
+            return state.model.replace(symbols, model or Assignment())
+
+        if self.disk_cache is not None:
+            cached = self.disk_cache.lookup(query)
+            if cached is not None:
+                result, model = cached
+                self.cache.store(query, result, model)
+                if not result:
+                    return None
+                return state.model.replace(symbols, model or Assignment())
+
+        if len(query) <= len(pc):
+            # only a part of the path condition is relevant
+            status = self.solver.check_constraints(query)
+        else:
+            status = self.solver.check(pc, condition)
+
+        if status == unknown:
+            # the branch is not explored
+            self.unknown_queries += 1
+        if status == unsat:
+            self.cache.store(query, False)
+            if self.disk_cache is not None:
+                self.disk_cache.store(query, False)
+        if status != sat:
+            return None
+
+        model = Assignment.from_model(self.solver.model(),
+                                      self.slicer.consts(symbols))
+        self.cache.store(query, True, model)
+        if self.disk_cache is not None:
+            self.disk_cache.store(query, True, model)
+        return state.model.replace(symbols, model)
+
+    def feasiblePaths(self, state, condition):
+        """
+        Get the guards of the constituent paths of the merged state on which
+        the condition is satisfiable, None if there is only one such path
+        """
+        paths = [g for g in state.paths
+                 if self.isFeasible(state, And(g, condition)) is not None]
+        return paths if len(paths) > 1 else None
+
     def executeJump(self, state):
         jump = state.pc
-        sec_state = state.copy()
 
         def assign_block(op_branch_side, state_variation):
             successorblock = jump.get_operand(op_branch_side)
+            if self.liveness is not None:
+                self.dropDead(state_variation, jump.get_block(),
+                              successorblock)
             state_variation.pc = successorblock[0]
             return state_variation
 
@@ -210,70 +391,403 @@ class SymbolicExecutor(Interpreter):
         if condval is None:
             state.error = f"Using unknown value: {jump.get_condition()}"
             return [state]
-        state.constraints.append(condval)
-        sec_state.constraints.append(Not(condval))
-        s = Solver()
 
-        condition = s.check(state.constraints)
-        neq_condition = s.check(sec_state.constraints)
+        condition, neq_condition = self.checkBranch(state, condval)
+        negation = self.expressions.negation(condval)
+
+        if condition is not None and neq_condition is not None:
+            sec_state = state.copy()
+            if state.paths is not None:
+                state.paths = self.feasiblePaths(state, condval)
+                sec_state.paths = self.feasiblePaths(sec_state, negation)
+            state.add_constraint(condval, condition)
+            sec_state.add_constraint(negation, neq_condition)
+            successors = [assign_block(0, state), assign_block(1, sec_state)]
+        elif condition is not None:
+            state.add_constraint(condval, condition)
+            successors = [assign_block(0, state)]
+        elif neq_condition is not None:
+            state.add_constraint(negation, neq_condition)
+            successors = [assign_block(1, state)]
+        else:
+            return []
 
-        if condition == sat and neq_condition == sat:
-            return [assign_block(0, state), assign_block(1, sec_state)]
-        elif condition == sat:
-            return [assign_block(0, state)]
-        elif neq_condition == sat:
-            return [assign_block(1, sec_state)]
+        if self.loops:
+            return self.enterLoops(jump.get_block(), successors)
+        return successors
+
+    def enterLoops(self, source, states):
+        """
+        Handle the states that jumped from the block source to headers
+        of loops: bound the number of iterations and accelerate the loops
+        """
+        result = []
+        for state in states:
+            header = state.pc.get_block()
+            loop = self.loops.get(header)
+            if loop is None:
+                result.append(state)
+                continue
+
+            if source in loop.blocks:
+                # the back edge, next iteration
+                if self.unroll_bound is not None:
+                    n = state.iterations.get(header, 0) + 1
+                    if n > self.unroll_bound:
+                        self.bounded_paths += state.multiplicity()
+                        continue
+                    state.iterations = {**state.iterations, header: n}
+                result.append(state)
+                continue
+
+            if header in state.iterations:
+                state.iterations = {h: n for h, n in state.iterations.items()
+                                    if h is not header}
+            if self.accelerator is not None and\
+               self.accelerator.get(header) is not None:
+                state = self.accelerateLoop(state)
+                if state is None:
+                    continue
+            result.append(state)
+        return result
+
+    def accelerateLoop(self, state):
+        """
+        Execute the whole loop at once using its summary, return None
+        if the loop cannot be left
+        """
+        summary = self.accelerator.get(state.pc.get_block())
+        trip = Int(f"__trip{self.accelerated}")
+        result = summary.apply(state, trip)
+        if result is None:
+            return state
+        constraint, variables, values = result
+
+        model = self.isFeasible(state, constraint)
+        if model is None:
+            return None
+        self.accelerated += 1
+        if state.paths is not None:
+            state.paths = self.feasiblePaths(state, constraint)
+        state.add_constraint(constraint, model)
+
+        # loops with a concrete number of iterations stay concrete
+        count = model.value(trip)
+        if is_int_value(count) and\
+           self.isFeasible(state, trip != count) is None:
+            variables = [(v, simplify(substitute(e, (trip, count))))
+                         for v, e in variables]
+            values = [(i, simplify(substitute(e, (trip, count))))
+                      for i, e in values]
+
+        for var, value in variables:
+            state.write(var, value)
+        for inst, value in values:
+            state.set(inst, value)
+        if self.liveness is not None:
+            self.dropDead(state, summary.block, summary.exit)
+        state.pc = summary.exit[0]
+        return state
 
     def executeAssert(self, state):
         instruction = state.pc
-        sec_state = state.copy()
 
         condval = state.eval(instruction.get_condition())
         if condval is None:
             state.error = f"Using unknown value!"
             return [state]
-        state.constraints.append(condval)
-        sec_state.constraints.append(Not(condval))
-        s = Solver()
 
-        condition = s.check(state.constraints)
-        neq_condition = s.check(sec_state.constraints)
+        condition, neq_condition = self.checkBranch(state, condval)
 
-        if neq_condition == sat:
+        if neq_condition is not None and state.paths is not None:
+            return self.executeMergedAssert(state, condval)
+        if neq_condition is not None:
             self.errors += 1
             self.executed_paths += 1
             return []
-        if condition == sat: return [state]
-        if condition == unsat: return []
+        if condition is not None:
+            state.add_constraint(condval, condition)
+            return [state]
+        return []
+
+    def executeMergedAssert(self, state, condval):
+        """
+        Execute the assertion that fails in the merged state: the paths
+        that can violate the assertion are errors, the other paths go on
+        """
+        safe = []
+        for g in state.paths:
+            if self.isFeasible(state, And(g, Not(condval))) is not None:
+                self.errors += 1
+                self.executed_paths += 1
+            else:
+                safe.append(g)
+        if not safe:
+            return []
+
+        restriction = And(condval, safe[0] if len(safe) == 1 else Or(*safe))
+        model = self.isFeasible(state, restriction)
+        if model is None:
+            return []
+        state.add_constraint(restriction, model)
+        state.paths = safe if len(safe) > 1 else None
+        return [state]
+
+    def initialState(self):
+        """ Get the state at the entry of the program """
+        entryblock = self.program.get_entry()
+        return SymbolicExecutionState(entryblock[0],
+                                      self.program.get_variables_num(),
+                                      self.program.get_values_num(),
+                                      self.expressions)
+
+    def get_results(self):
+        """ Get the (partial) results of the exploration """
+        results = {
+            'status': 'complete' if self.stopped is None else self.stopped,
+            'theory': self.expressions.theory(),
+            'executed_paths': self.executed_paths,
+            'error_paths': self.errors,
+            'states_left': self.states_left,
+            'unknown_queries': self.unknown_queries,
+            'solver_calls': self.solver.checks,
+            'peak_memory_kb': peak_memory(),
+        }
+        if self.budget is not None:
+            results['time'] = self.budget.elapsed()
+            results['depth_bounded_paths'] = self.depth_bounded
+        return results
 
     def run(self):
-        state_list = []
-        entryblock = program.get_entry()
-
-        state_list.append(SymbolicExecutionState(entryblock[0]))
-        while state_list:
-            item = state_list[-1]
-            state_list.pop(-1)
-            state_list = state_list + self.executeInstruction(item)
-            if len(state_list) == 0:
+        scheduler = self.scheduler
+        merger = self.merger
+        budget = self.budget
+        if budget is not None:
+            budget.start()
+        scheduler.add([self.initialState()])
+        while scheduler:
+            if budget is not None:
+                self.stopped = budget.exhausted(self)
+                if self.stopped is not None:
+                    break
+            item = scheduler.pop()
+            successors = self.executeInstruction(item)
+            if budget is not None and budget.depth is not None:
+                deep = [s for s in successors if budget.too_deep(s)]
+                if deep:
+                    self.depth_bounded += sum(s.multiplicity() for s in deep)
+                    successors = [s for s in successors
+                                  if not budget.too_deep(s)]
+            if merger is not None:
+                successors = merger.park(successors)
+                # parked states go on when nothing else can be executed
+                if not successors and not scheduler:
+                    successors = merger.release()
+            scheduler.add(successors)
+            if len(scheduler) == 0:
                 self.executed_paths = self.executed_paths + 1
 
-        pass
+        self.states_left = len(scheduler)
+        if merger is not None:
+            self.states_left += len(merger)
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+        if self.stopped is not None:
+            print(f"Budget exhausted: {self.stopped}")
+            print(f"States left: {self.states_left}")
         print(f"Executed paths: {self.executed_paths}")
         print(f"Error paths: {self.errors}")
+        print(f"Solver calls: {self.solver.checks}")
+        if self.disk_cache is not None:
+            print(f"Query cache hits: {self.disk_cache.hits}")
+        if merger is not None:
+            print(f"Merged states: {merger.merged}")
+        if self.unroll_bound is not None:
+            print(f"Bounded paths: {self.bounded_paths}")
+        if budget is not None and budget.depth is not None:
+            print(f"Depth-bounded paths: {self.depth_bounded}")
+        if self.unknown_queries:
+            print(f"Unknown queries: {self.unknown_queries}")
+        if self.intervals is not None:
+            print(f"Proven by intervals: {self.proven_checks}")
 
 
 if __name__ == "__main__":
+    from argparse import ArgumentParser
     from parser import Parser
-    from sys import argv
-    if len(argv) != 2:
-        print(f"Wrong numer of arguments, usage: {argv[0]} <program>")
+    from ircache import load_program
+    from optimizer import PassManager
+    from profiler import Profiler, trace
+    import json
+
+    argparser = ArgumentParser()
+    argparser.add_argument('-j', '--jobs', type=int, default=1,
+                           help='number of worker processes (default: 1)')
+    argparser.add_argument('--search', choices=STRATEGIES.keys(),
+                           default='dfs',
+                           help='search strategy (default: dfs), workers of '
+                                'the parallel executor always use dfs')
+    argparser.add_argument('--seed', type=int, default=None,
+                           help='seed for the random-path search')
+    argparser.add_argument('--merge', action='store_true',
+                           help='merge states at joins outside of loops '
+                                '(not used by the parallel executor)')
+    argparser.add_argument('--accelerate', action='store_true',
+                           help='summarize counting loops instead of '
+                                'unrolling them (one job only)')
+    argparser.add_argument('--unroll-bound', type=int, default=None,
+                           metavar='K',
+                           help='stop paths that iterate a loop more than '
+                                'K times (reported as bounded paths, one job '
+                                'only)')
+    argparser.add_argument('--ir-cache', action='store_true',
+                           help='load the parsed program from a cache file '
+                                'next to it (PROGRAM.irc), create the file '
+                                'if it is missing or outdated')
+    argparser.add_argument('-O', '--optimize', action='store_true',
+                           help='optimize the program before running it')
+    argparser.add_argument('--query-cache', metavar='DB',
+                           help='keep results of solver queries in the '
+                                'SQLite database across runs')
+    argparser.add_argument('--max-time', type=float, default=None,
+                           metavar='SECONDS',
+                           help='stop the exploration after the time')
+    argparser.add_argument('--max-memory', type=float, default=None,
+                           metavar='MB',
+                           help='stop the exploration when the peak memory '
+                                'exceeds the limit')
+    argparser.add_argument('--max-paths', type=int, default=None,
+                           help='stop the exploration after the number '
+                                'of paths')
+    argparser.add_argument('--max-depth', type=int, default=None,
+                           help='drop paths with more constraints '
+                                '(reported as depth-bounded paths)')
+    argparser.add_argument('--solver-timeout', type=float, default=None,
+                           metavar='SECONDS',
+                           help='timeout of every solver query, the '
+                                'branches of unknown queries are dropped')
+    argparser.add_argument('--report', metavar='JSON',
+                           help='write the (partial) results to the file')
+    argparser.add_argument('--bv', type=int, choices=WIDTHS, default=None,
+                           metavar='WIDTH',
+                           help='model values as signed bit-vectors of the '
+                                'width (8, 16, 32 or 64) with wrapping '
+                                'arithmetic instead of integers')
+    argparser.add_argument('--compare-theories', action='store_true',
+                           help='run the program with integers and with '
+                                'bit-vectors (of the --bv width, default: '
+                                '32) and compare the results')
+    argparser.add_argument('--intervals', action='store_true',
+                           help='decide jumps and assertions by an interval '
+                                'analysis before the exploration where '
+                                'possible (integers only)')
+    argparser.add_argument('--no-prune', action='store_true',
+                           help='keep dead values and variables in states')
+    argparser.add_argument('--trace', action='store_true',
+                           help='print every executed instruction')
+    argparser.add_argument('--profile', metavar='JSON',
+                           help='profile the execution, write the results '
+                                'to the file (see profiler.py)')
+    argparser.add_argument('--flamegraph', metavar='FILE',
+                           help='profile the execution, write collapsed '
+                                'stacks for flame graphs to the file')
+    argparser.add_argument('program')
+    args = argparser.parse_args()
+    profile = args.profile or args.flamegraph
+    if args.jobs > 1 and (profile or args.trace):
+        print("Profiling and tracing work only with one job")
         exit(1)
-    parser = Parser(argv[1])
-    program = parser.parse()
+    if args.jobs > 1 and (args.accelerate or args.unroll_bound is not None):
+        print("Loop acceleration and unroll bounds work only with one job")
+        exit(1)
+    bitvectors = args.bv is not None or args.compare_theories
+    if bitvectors and args.jobs > 1:
+        print("Bit-vectors work only with one job")
+        exit(1)
+    if bitvectors and args.accelerate:
+        print("Loop acceleration works only with integers")
+        exit(1)
+    if bitvectors and args.intervals:
+        print("The interval analysis works only with integers")
+        exit(1)
+    if args.compare_theories and (profile or args.trace):
+        print("Profiling and tracing do not work with --compare-theories")
+        exit(1)
+    budget = None
+    limits = (args.max_time, args.max_memory, args.max_paths,
+              args.max_depth, args.solver_timeout)
+    if any(limit is not None for limit in limits):
+        if args.jobs > 1:
+            print("Budgets work only with one job")
+            exit(1)
+        budget = Budget(args.max_time,
+                        None if args.max_memory is None
+                        else args.max_memory * 1024,
+                        args.max_paths, args.max_depth, args.solver_timeout)
+
+    if args.ir_cache:
+        program = load_program(args.program)
+    else:
+        parser = Parser(args.program)
+        program = parser.parse()
     if program is None:
         print("Program parsing failed!")
         exit(1)
-
-    I = SymbolicExecutor(program)
-    exit(I.run())
+    if args.optimize:
+        PassManager().run(program)
+
+    def executor(width):
+        return SymbolicExecutor(program, args.search, args.seed, args.merge,
+                                args.accelerate, args.unroll_bound,
+                                args.query_cache, budget, not args.no_prune,
+                                width, args.intervals)
+
+    if args.compare_theories:
+        from time import perf_counter
+        results = []
+        for width in (None, args.bv or 32):
+            I = executor(width)
+            print(f"Theory: {I.expressions.theory()}")
+            start = perf_counter()
+            I.run()
+            results.append({**I.get_results(),
+                            'time': perf_counter() - start})
+        print(f"{'theory':>8} {'paths':>8} {'errors':>8} "
+              f"{'solver':>8} {'unknown':>8} {'time':>8}")
+        for r in results:
+            print(f"{r['theory']:>8} {r['executed_paths']:>8} "
+                  f"{r['error_paths']:>8} {r['solver_calls']:>8} "
+                  f"{r['unknown_queries']:>8} {r['time']:>8.2f}")
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(results, f, indent=2)
+        # the results differ if some value overflows the bit-vectors
+        # (or a symbolic divisor can be zero, the theories give
+        # different values to such divisions)
+        differ = any(results[0][k] != results[1][k]
+                     for k in ('executed_paths', 'error_paths'))
+        if differ:
+            print("The theories differ")
+        exit(1 if differ else 0)
+
+    if args.jobs > 1:
+        from parallel import ParallelSymbolicExecutor
+        I = ParallelSymbolicExecutor(program, args.program, args.jobs,
+                                      args.optimize, args.query_cache,
+                                      args.intervals)
+    else:
+        I = executor(args.bv)
+    if args.trace:
+        trace(I)
+    if profile:
+        profiler = Profiler()
+        profiler.attach(I)
+    result = I.run()
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(I.get_results(), f, indent=2)
+    if args.profile:
+        profiler.write_json(args.profile)
+    if args.flamegraph:
+        profiler.write_collapsed(args.flamegraph)
+    exit(result)
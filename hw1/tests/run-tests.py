@@ -1,9 +1,16 @@
 #!/usr/bin/python3
 
-from subprocess import Popen, PIPE
+from subprocess import Popen, PIPE, STDOUT
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Timer
+from time import perf_counter
+from os import cpu_count, wait4, WIFEXITED, WEXITSTATUS
 from os.path import abspath, dirname, join
-from sys import argv, stderr
+from sys import argv, stderr, executable
+import json
 
+# (program, executed paths, error paths[, options of the executor
+#  [, maximal number of solver calls]])
 TESTS=[
 ("example1.txt", 1, 0),
 ("example2.txt", 2, 1),
@@ -16,44 +23,179 @@ TESTS=[
 ("simple-nondet.txt", 3, 1),
 ("sum.txt", 1, 0),
 ("asserts.txt", 11, 10),
-("implies.txt", 5, 3)
+("implies.txt", 5, 3),
+("accelerate.txt", 3, 1, ["--accelerate"]),
+("bv-division.txt", 3, 0, ["--bv", "8"]),
+("bv-division.txt", 3, 0, ["--bv", "64"]),
+("bv-overflow.txt", 3, 1, ["--bv", "8"]),
+("bv-overflow.txt", 2, 0),
+("intervals.txt", 3, 0, ["--intervals"], 2),
 ]
 
-def main(se):
-    total, failed = 0, 0
-    for program, nop, noe in TESTS:
-        total += 1
-        cmd = [abspath(se), abspath(join(dirname(argv[0]), program))]
-        print('Running: ', " ".join(cmd))
-        P = Popen(cmd, stdout=PIPE, stderr=PIPE)
-        out, err = P.communicate()
-        if out is None:
-            print(f"{program}... failed")
-            failed += 1
+# tests of the concolic executor (run on its own, whatever executor
+# is tested), (program, executed paths, error paths)
+CONCOLIC = join(dirname(abspath(__file__)), "..", "concolic.py")
+CONCOLIC_TESTS=[
+("asserts.txt", 11, 10),
+("implies.txt", 5, 3),
+]
+
+# slowdowns smaller than this (in seconds) are noise, not regressions
+MIN_SLOWDOWN = 0.1
+
+
+def test_name(program, options=(), solver_calls=None):
+    return " ".join([program, *options])
+
+
+def run_test(se, program, nop, noe, timeout, options=(), solver_calls=None):
+    """
+    Run the executor on the program, return the record of the run,
+    se is the path of the executor or the command that runs it
+    """
+    se = [abspath(se)] if isinstance(se, str) else se
+    cmd = [*se, abspath(join(dirname(argv[0]), program)), *options]
+    record = {"command": " ".join(cmd), "status": "failed",
+              "time": None, "max_rss_kb": None, "solver_calls": None}
+    start = perf_counter()
+    try:
+        P = Popen(cmd, stdout=PIPE, stderr=STDOUT)
+    except OSError as e:
+        record["error"] = str(e)
+        return record
+    killed = []
+
+    def kill():
+        killed.append(True)
+        P.kill()
+
+    timer = Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.start()
+    out = P.stdout.read()
+    P.stdout.close()
+    # wait4 gives the resource usage of the finished process
+    _, status, usage = wait4(P.pid, 0)
+    record["time"] = perf_counter() - start
+    if timer:
+        timer.cancel()
+    P.returncode = WEXITSTATUS(status) if WIFEXITED(status) else -1
+    # ru_maxrss is in kilobytes on Linux
+    record["max_rss_kb"] = usage.ru_maxrss
+
+    nopstr = f"Executed paths: {nop}"
+    noestr = f"Error paths: {noe}"
+
+    have_nopstr = False
+    have_noestr = False
+    for line in (l.strip().decode('utf-8') for l in out.splitlines()):
+        if line == nopstr:
+            have_nopstr = True
+        elif line == noestr:
+            have_noestr = True
+        elif line.startswith("Solver calls: "):
+            record["solver_calls"] = int(line.split(":")[1])
+
+    if killed:
+        record["status"] = "timeout"
+    elif have_nopstr and have_noestr and\
+         (solver_calls is None or (record["solver_calls"] is not None and
+                                   record["solver_calls"] <= solver_calls)):
+        record["status"] = "ok"
+    return record
+
+
+def regressions(report, baseline, tolerance):
+    """ Get the names of tests that are slower than in the baseline """
+    slower = []
+    for program, record in report["tests"].items():
+        base = baseline.get("tests", {}).get(program)
+        if base is None or base.get("time") is None or\
+           record["time"] is None:
             continue
+        if record["time"] > base["time"] * (1 + tolerance) and\
+           record["time"] - base["time"] > MIN_SLOWDOWN:
+            slower.append(program)
+    return slower
 
-        nopstr = f"Executed paths: {nop}"
-        noestr = f"Error paths: {noe}"
 
-        have_nopstr = False
-        have_noestr = False
-        for line in (l.strip().decode('utf-8') for l in out.splitlines()):
-            if line == nopstr:
-                have_nopstr = True
-            elif line == noestr:
-                have_noestr = True
+def main(se, jobs=None, timeout=None, report_path=None,
+         baseline_path=None, tolerance=0.2):
+    total, failed = 0, 0
+    report = {"executor": abspath(se), "jobs": jobs, "tests": {}}
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs or cpu_count()) as pool:
+        runs = {pool.submit(run_test, se, program, nop, noe, timeout,
+                            *options): test_name(program, *options)
+                for program, nop, noe, *options in TESTS}
+        runs.update({pool.submit(run_test, [executable, CONCOLIC], program,
+                                 nop, noe, timeout): f"concolic {program}"
+                     for program, nop, noe in CONCOLIC_TESTS})
+        for future in as_completed(runs):
+            program = runs[future]
+            record = future.result()
+            report["tests"][program] = record
+            total += 1
+            if record["status"] != "ok":
+                failed += 1
+            details = []
+            if record["time"] is not None:
+                details.append(f"{record['time']:.2f} s")
+            if record["max_rss_kb"] is not None:
+                details.append(f"{record['max_rss_kb'] / 1024:.1f} MB")
+            if record["solver_calls"] is not None:
+                details.append(f"{record['solver_calls']} solver calls")
+            print(f"{program}... {record['status']} ({', '.join(details)})")
+    report["time"] = perf_counter() - start
+    # keep the order of the tests in the report
+    names = [test_name(program, *options)
+             for program, _, _, *options in TESTS] +\
+            [f"concolic {program}" for program, _, _ in CONCOLIC_TESTS]
+    report["tests"] = {name: report["tests"][name] for name in names}
+
+    slower = []
+    if baseline_path:
+        with open(baseline_path) as f:
+            slower = regressions(report, json.load(f), tolerance)
+        for program in slower:
+            record = report["tests"][program]
+            record["regression"] = True
+            print(f"{program}... slower than the baseline "
+                  f"({record['time']:.2f} s)")
 
-        if not have_nopstr or not have_noestr:
-            print(f"{program}... failed")
-            failed += 1
-        else:
-            print(f"{program}... ok")
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
 
     print(f"Result: {failed} of {total} failed")
+    if baseline_path:
+        print(f"Regressions: {len(slower)} of {total}")
+    return 1 if failed or slower else 0
+
 
 if __name__ == "__main__":
-    if len(argv) != 2:
-        print(f"Usage: {argv[0]} <symbolic-executor>", file=stderr)
+    from argparse import ArgumentParser
+
+    argparser = ArgumentParser()
+    argparser.add_argument('-j', '--jobs', type=int, default=None,
+                           help='number of tests run at once '
+                                '(default: number of CPUs)')
+    argparser.add_argument('--timeout', type=float, default=None,
+                           help='kill tests that run longer (in seconds)')
+    argparser.add_argument('--report', metavar='JSON',
+                           help='write times, memory and solver calls '
+                                'of the tests to the file')
+    argparser.add_argument('--baseline', metavar='JSON',
+                           help='report of an earlier run to compare to, '
+                                'tests that got slower are regressions')
+    argparser.add_argument('--tolerance', type=float, default=0.2,
+                           help='allowed slowdown against the baseline '
+                                '(default: 0.2, i.e. 20%%)')
+    argparser.add_argument('symbolic_executor')
+    args = argparser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        print("The number of jobs must be positive", file=stderr)
         exit(1)
 
-    main(argv[1])
+    exit(main(args.symbolic_executor, args.jobs, args.timeout, args.report,
+              args.baseline, args.tolerance))